@@ -1,24 +1,78 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import pyarrow as pa
+import pyarrow.compute as pc
 from datetime import datetime
+import io
 import os
 import sys
+import requests
+
+from utils.api_errors import is_transient_error, call_with_retry
+from utils.page_helpers import sorted_options, apply_sidebar_filters
+from utils.parquet_cache import sheet_version, parquet_cache_path, read_parquet_cache, write_parquet_cache
 
 # Configuración básica
 APP_TITLE = "Dashboard Comedores Comunitarios"
 
-# Configuración de la página
-st.set_page_config(
-    page_title=APP_TITLE,
-    page_icon="🍽️",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+# Hoja de Google Sheets por defecto (se puede sobrescribir desde los secrets)
+DEFAULT_SHEET_ID = "1fbs-J474JbvV3USg5aQlLUW9sNqkBjcd63qBU1nJeeI"
+DEFAULT_WORKSHEET_NAME = "Respuestas de formulario 1"
+
+# Endpoint de exportación CSV de Google Sheets (solo hojas compartidas por enlace).
+# Exporta el texto de cada celda tal cual; la pestaña se identifica por su gid
+CSV_EXPORT_URL = "https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid={gid}"
+
+# Permisos de solo lectura para la cuenta de servicio
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets.readonly',
+    'https://www.googleapis.com/auth/drive.readonly'
+]
+
+# Vigencia de los datos cargados con la cuenta de servicio (segundos)
+DATA_CACHE_TTL = 1800
+
+# Mensajes de diagnóstico de la conexión (variable de entorno DEBUG_MODE=true)
+DEBUG_MODE = os.getenv('DEBUG_MODE', 'False').lower() == 'true'
 
-# CSS personalizado
-st.markdown("""
+# Tipo para las columnas de texto (cadenas respaldadas por Arrow)
+TEXT_DTYPE = "string[pyarrow]"
+
+# Nombres de las columnas del dataset (sin espacios sobrantes; ver clean_dataframe)
+COLS = {
+    'nombre': 'NOMBRE DEL COMEDOR',
+    'tipo': 'TIPO DE COMEDOR',
+    'barrio': 'BARRIO',
+    'comuna': 'COMUNA',
+    'nodo': 'NODO',
+    'nicho': 'NICHO',
+    'año': 'AÑO DE VINCULACIÓN AL PROGRAMA'
+}
+
+# Posibles nombres de cada columna usada por el dashboard (búsqueda flexible)
+COLUMN_SEARCH_TERMS = {
+    'nombre': [COLS['nombre'], 'NOMBRE', 'COMEDOR'],
+    'tipo': [COLS['tipo'], 'TIPO', 'COMEDOR'],
+    'barrio': [COLS['barrio']],
+    'comuna': [COLS['comuna']],
+    'nodo': [COLS['nodo']],
+    'nicho': [COLS['nicho']]
+}
+
+# Columnas que se convierten a número
+NUMERIC_COLUMNS = [COLS['comuna'], COLS['nodo'], COLS['nicho'], COLS['año']]
+
+# Texto que se acepta como número al convertir NUMERIC_COLUMNS (p. ej. '3', '-2', '2020', '1.5')
+NUMBER_PATTERN = r'^[+-]?(\d+(\.\d*)?|\.\d+)$'
+
+# Columnas de texto con pocos valores distintos que se guardan como categorías
+CATEGORY_COLUMNS = [COLS['nombre'], COLS['barrio'], COLS['tipo']]
+
+# Filas de la vista rápida que se envían al navegador (la descarga incluye todas)
+PREVIEW_ROWS = 500
+
+# Estilos de la página, definidos una sola vez al importar el módulo
+CUSTOM_CSS = """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -27,12 +81,6 @@ st.markdown("""
         text-align: center;
         margin-bottom: 2rem;
     }
-    .metric-card {
-        background-color: #f0f2f6;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        border-left: 4px solid #2E7D32;
-    }
     .filter-header {
         color: #1976D2;
         font-weight: bold;
@@ -53,110 +101,171 @@ st.markdown("""
         color: #C62828;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# Configuración de la página
+st.set_page_config(
+    page_title=APP_TITLE,
+    page_icon="🍽️",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# CSS personalizado (st.html lo envía tal cual, sin pasar por el parser de Markdown)
+st.html(CUSTOM_CSS)
 
 def make_headers_unique(headers):
     """Hace únicos los headers duplicados agregando sufijos numéricos"""
-    unique_headers = []
-    header_counts = {}
+    headers = pd.Series(headers, dtype=object)
+    # Número de apariciones previas de cada header: 0 para la primera, 1, 2... para las repetidas
+    counts = headers.groupby(headers, sort=False).cumcount()
+    return headers.where(counts == 0, headers + '_' + counts.astype(str)).tolist()
+
+def _sheets_config():
+    """Sección [google_sheets] de los secrets (vacía si no hay secrets)"""
+    try:
+        return st.secrets.get("google_sheets", {})
+    except FileNotFoundError:
+        return {}
+
+def get_sheet_config():
+    """Obtiene el ID de la hoja y el nombre de la pestaña desde los secrets"""
+    sheets_config = _sheets_config()
+    sheet_id = sheets_config.get("sheet_id", DEFAULT_SHEET_ID)
+    worksheet_name = sheets_config.get("worksheet_name", DEFAULT_WORKSHEET_NAME)
+    return sheet_id, worksheet_name
+
+def get_public_worksheet_gid():
+    """gid de la pestaña si la hoja está configurada como pública (public = true); None si no"""
+    sheets_config = _sheets_config()
+    if not sheets_config.get("public", False):
+        return None
+    return sheets_config.get("worksheet_gid", 0)
+
+@st.cache_data(ttl=300)
+def load_data_csv(sheet_id, gid):
+    """Carga datos desde la exportación CSV de Google Sheets, sin autenticación"""
+    url = CSV_EXPORT_URL.format(sheet_id=sheet_id, gid=gid)
     
-    for header in headers:
-        if header in header_counts:
-            header_counts[header] += 1
-            unique_header = f"{header}_{header_counts[header]}"
-        else:
-            header_counts[header] = 0
-            unique_header = header
-        
-        unique_headers.append(unique_header)
+    try:
+        response = requests.get(url, timeout=30)
+    except requests.RequestException:
+        return None
+    
+    # Las hojas privadas redirigen a la página de inicio de sesión (HTML) en lugar de devolver CSV
+    if response.status_code != 200 or 'text/csv' not in response.headers.get('Content-Type', ''):
+        return None
+    
+    # Todo como texto, igual que los valores que devuelve gspread (la conversión la hace clean_dataframe)
+    try:
+        rows = pd.read_csv(io.BytesIO(response.content), header=None, dtype=TEXT_DTYPE, keep_default_na=False)
+    except (ValueError, pd.errors.EmptyDataError):
+        return None
+    
+    if len(rows) < 2:
+        return None
     
-    return unique_headers
+    # Encabezados con la misma normalización que la carga con la cuenta de servicio
+    headers = make_headers_unique(rows.iloc[0].tolist())
+    df = pd.DataFrame(rows.iloc[1:].to_numpy(), columns=headers, dtype=TEXT_DTYPE)
+    
+    return clean_dataframe(df)
+
+def has_service_account():
+    """Indica si la cuenta de servicio está configurada en los secrets"""
+    try:
+        return 'gcp_service_account' in st.secrets
+    except FileNotFoundError:
+        return False
+
+@st.cache_resource(show_spinner=False)
+def _gs_client():
+    """Crea el cliente de gspread autorizado con la cuenta de servicio"""
+    import gspread
+    from google.oauth2.service_account import Credentials
+    
+    credentials_info = dict(st.secrets["gcp_service_account"])
+    credentials = Credentials.from_service_account_info(credentials_info, scopes=SCOPES)
+    return gspread.authorize(credentials)
+
+@st.cache_resource(show_spinner=False)
+def _get_spreadsheet(sheet_id):
+    """Abre la hoja de cálculo con el cliente autorizado (una sola vez por proceso)"""
+    return _gs_client().open_by_key(sheet_id)
+
+@st.cache_resource(show_spinner=False)
+def _get_worksheet(sheet_id, worksheet_name):
+    """Obtiene la pestaña indicada de la hoja de cálculo (una sola vez por proceso)"""
+    return _get_spreadsheet(sheet_id).worksheet(worksheet_name)
+
+def _read_parquet_cache(path):
+    """Lee la copia Parquet de la hoja y la marca como una carga nueva (None si no hay copia)"""
+    df = read_parquet_cache(path)
+    if df is None:
+        return None
+    # El mapeo de columnas y la marca de carga se recalculan como en clean_dataframe
+    df.attrs['col_map'] = resolve_columns(df)
+    df.attrs['loaded_at'] = datetime.now().isoformat()
+    return df
+
+@st.cache_resource(show_spinner=False)
+def _last_good_data():
+    """Última carga exitosa por (sheet_id, hoja), compartida por todas las sesiones del proceso"""
+    return {}
 
 # Función para cargar datos usando Streamlit Secrets
-@st.cache_data(ttl=300)
-def load_data_secure():
+# (en memoria; la única copia en disco es el Parquet de la última versión de la hoja)
+@st.cache_data(ttl=DATA_CACHE_TTL, show_spinner=False, max_entries=4)
+def load_data_secure(sheet_id, worksheet_name):
     """Carga datos usando configuración segura desde Streamlit Secrets"""
+    # Verificar si existen los secrets (sin ellos no se importan gspread ni google-auth)
+    if not has_service_account():
+        st.error("❌ Credenciales no configuradas. Configura los secrets en Streamlit Cloud.")
+        return None
+    
     try:
-        # Verificar si existen los secrets
-        if not hasattr(st, 'secrets') or 'gcp_service_account' not in st.secrets:
-            st.error("❌ Credenciales no configuradas. Configura los secrets en Streamlit Cloud.")
-            return None
-        
-        # Importar dependencias
         import gspread
-        from google.oauth2.service_account import Credentials
-        
-        # Obtener credenciales desde secrets
-        credentials_info = dict(st.secrets["gcp_service_account"])
-        
-        # CORREGIDO: Usar scope actualizado
-        scope = [
-            'https://www.googleapis.com/auth/spreadsheets.readonly',
-            'https://www.googleapis.com/auth/drive.readonly'
-        ]
-        
-        # Crear credenciales
-        credentials = Credentials.from_service_account_info(credentials_info, scopes=scope)
-        
-        # Autorizar el cliente
-        gc = gspread.authorize(credentials)
-        
-        # Obtener configuración de Google Sheets
-        sheet_id = st.secrets.get("google_sheets", {}).get("sheet_id", "1fbs-J474JbvV3USg5aQlLUW9sNqkBjcd63qBU1nJeeI")
-        worksheet_name = st.secrets.get("google_sheets", {}).get("worksheet_name", "Respuestas de formulario 1")
-        
+    except ImportError:
+        st.error("❌ gspread no está instalado; no se puede usar la cuenta de servicio.")
+        return None
+    
+    try:
         # Debug info
-        st.info(f"🔍 Conectando a Sheet ID: {sheet_id[:20]}...")
-        st.info(f"📋 Buscando hoja: {worksheet_name}")
-        
-        # Abrir la hoja de cálculo
-        spreadsheet = gc.open_by_key(sheet_id)
+        if DEBUG_MODE:
+            st.info(f"🔍 Conectando a Sheet ID: {sheet_id[:20]}...")
+            st.info(f"📋 Buscando hoja: {worksheet_name}")
         
-        # Listar todas las hojas disponibles para debug
-        available_sheets = [ws.title for ws in spreadsheet.worksheets()]
-        st.info(f"📄 Hojas disponibles: {', '.join(available_sheets)}")
+        # Abrir la hoja de cálculo (cliente y hoja se reutilizan entre recargas);
+        # las llamadas a la API reintentan unas pocas veces los errores pasajeros (429, 5xx, red)
+        spreadsheet = call_with_retry(_get_spreadsheet, sheet_id)
         
         # Intentar obtener la hoja específica
         try:
-            worksheet = spreadsheet.worksheet(worksheet_name)
+            worksheet = call_with_retry(_get_worksheet, sheet_id, worksheet_name)
         except gspread.WorksheetNotFound:
+            # Solo aquí hace falta listar las hojas (es una petición más a la API)
+            available_sheets = [ws.title for ws in spreadsheet.worksheets()]
             st.error(f"❌ Hoja '{worksheet_name}' no encontrada.")
             st.info(f"💡 Hojas disponibles: {', '.join(available_sheets)}")
             return None
         
-        # Manejar headers duplicados
-        try:
-            # Intentar método estándar primero
-            data = worksheet.get_all_records()
-            if not data:
-                st.warning("⚠️ La hoja está vacía o no tiene datos.")
-                return None
-            df = pd.DataFrame(data)
-            
-        except Exception as e:
-            if "header row" in str(e).lower() and ("unique" in str(e).lower() or "duplicates" in str(e).lower()):
-                # Método alternativo para headers duplicados
-                st.info("🔧 Detectados headers duplicados, aplicando corrección automática...")
-                
-                # Obtener datos como lista de listas
-                all_values = worksheet.get_all_values()
-                
-                if not all_values:
-                    st.error("❌ La hoja de cálculo está vacía")
-                    return None
-                
-                # Tomar la primera fila como headers y hacer únicos
-                headers = all_values[0]
-                unique_headers = make_headers_unique(headers)
-                
-                # Crear DataFrame con headers únicos
-                data_rows = all_values[1:]  # Excluir header
-                df = pd.DataFrame(data_rows, columns=unique_headers)
-                
-                st.success(f"✅ Headers duplicados corregidos automáticamente")
-            else:
-                st.error(f"❌ Error procesando datos: {str(e)}")
-                raise e
+        # Si esta versión de la hoja ya está guardada en Parquet, evitar la descarga completa
+        parquet_path = parquet_cache_path(sheet_id, worksheet_name, sheet_version(spreadsheet))
+        df = _read_parquet_cache(parquet_path)
+        if df is not None:
+            return df
+        
+        # Obtener todos los valores en una sola llamada y construir el DataFrame de una vez
+        all_values = call_with_retry(worksheet.get_all_values)
+        
+        if len(all_values) < 2:
+            st.warning("⚠️ La hoja está vacía o no tiene datos.")
+            return None
+        
+        # Tomar la primera fila como headers (haciendo únicos los duplicados)
+        # y construir las columnas directamente en buffers Arrow, sin pasar por object
+        headers = make_headers_unique(all_values[0])
+        df = pd.DataFrame(all_values[1:], columns=headers, dtype=TEXT_DTYPE)
         
         if df.empty:
             st.warning("⚠️ La hoja de cálculo no contiene datos")
@@ -165,6 +274,8 @@ def load_data_secure():
         # Limpiar datos básicos
         df = clean_dataframe(df)
         
+        write_parquet_cache(parquet_path, df)
+        
         return df
         
     except gspread.SpreadsheetNotFound:
@@ -172,36 +283,87 @@ def load_data_secure():
         st.info("💡 Asegúrate de que la cuenta de servicio tenga acceso a la hoja.")
         return None
     except Exception as e:
+        if is_transient_error(e):
+            # Cuota excedida, error del servidor o de red que persistió tras los reintentos:
+            # propagar para que el fallo no quede en caché y se use la última versión cargada
+            raise
+        # Error permanente (sin permiso...): None queda en caché como antes, sin volver a llamar a la API
+        # en cada interacción. Descartar los objetos cacheados por si quedaron inválidos (hoja borrada...)
+        _get_worksheet.clear()
+        _get_spreadsheet.clear()
         st.error(f"❌ Error al cargar datos: {str(e)}")
         # Mostrar más detalles del error para debug
         st.error(f"🔍 Tipo de error: {type(e).__name__}")
         return None
 
+def load_data_with_fallback(sheet_id, worksheet_name):
+    """
+    Carga con la cuenta de servicio; si la API sigue fallando tras los reintentos (cuota, servidor, red)
+    devuelve la última versión cargada de la hoja, si existe
+    """
+    try:
+        df = load_data_secure(sheet_id, worksheet_name)
+    except Exception as e:
+        # Error pasajero que persistió tras los reintentos de call_with_retry
+        df = _last_good_data().get((sheet_id, worksheet_name))
+        if df is not None:
+            st.warning("⚠️ No se pudo actualizar desde Google Sheets; se muestran los últimos datos cargados.")
+        else:
+            st.error(f"❌ Error al cargar datos: {str(e)}")
+            # Mostrar más detalles del error para debug
+            st.error(f"🔍 Tipo de error: {type(e).__name__}")
+        return df
+    
+    if df is not None:
+        _last_good_data()[(sheet_id, worksheet_name)] = df
+    return df
+
+def parse_numeric_column(series):
+    """Convierte una columna a número con los kernels de Arrow; lo que no sea número queda como NA"""
+    if not pd.api.types.is_string_dtype(series.dtype) or isinstance(series.dtype, pd.CategoricalDtype):
+        return pd.to_numeric(series, errors='coerce', downcast='integer')
+    text = pc.utf8_trim_whitespace(pa.array(series, type=pa.string()))
+    is_number = pc.match_substring_regex(text, NUMBER_PATTERN)
+    numbers = pc.cast(pc.if_else(is_number, text, pa.scalar(None, pa.string())), pa.float64())
+    parsed = numbers.to_pandas(types_mapper={pa.float64(): pd.Float64Dtype()}.get)
+    parsed.index = series.index
+    # Entero con nulos más pequeño que admita la columna (Float64 si hay decimales)
+    return pd.to_numeric(parsed, downcast='integer')
+
+# Al cambiar esta limpieza, subir CACHE_FORMAT_VERSION (utils/parquet_cache.py): el Parquet guarda su resultado
 def clean_dataframe(df):
     """Limpia y prepara el DataFrame"""
     try:
         # Eliminar filas completamente vacías
         df = df.dropna(how='all')
         
-        # CORREGIDO: Convertir columnas numéricas donde sea posible
-        numeric_columns = ['COMUNA', 'NODO ', 'NICHO ', 'AÑO DE VINCULACIÓN AL PROGRAMA']
-        for col in numeric_columns:
+        # Normalizar los encabezados una sola vez (la hoja trae espacios sobrantes, p. ej. 'NODO ')
+        df.columns = make_headers_unique(df.columns.str.strip().tolist())
+        
+        # Convertir columnas numéricas en bloque al entero con nulos más pequeño que admita cada una
+        # (Int8/Int16 para comunas, nodos y años; los valores no convertibles quedan como NA)
+        numeric_columns = [col for col in NUMERIC_COLUMNS if col in df.columns]
+        if numeric_columns:
+            df[numeric_columns] = df[numeric_columns].apply(parse_numeric_column)
+        
+        # Limpiar espacios en blanco en todas las columnas de texto a la vez
+        text_columns = df.select_dtypes(include=['object', 'string']).columns
+        if len(text_columns) > 0:
+            text_data = df[text_columns].astype(TEXT_DTYPE).apply(lambda s: s.str.strip())
+            # Reemplazar cadenas vacías con NaN
+            df[text_columns] = text_data.mask(text_data.isin(['', 'nan', 'None']))
+        
+        # Columnas de filtro de baja cardinalidad como categorías (comparaciones sobre códigos enteros)
+        for col in CATEGORY_COLUMNS:
             if col in df.columns:
-                try:
-                    # Intentar conversión numérica, mantener NaN para valores no convertibles
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                except Exception as e:
-                    st.warning(f"⚠️ No se pudo convertir columna '{col}' a numérica: {e}")
+                df[col] = df[col].astype('category')
         
-        # Limpiar espacios en blanco en columnas de texto
-        text_columns = df.select_dtypes(include=['object']).columns
-        for col in text_columns:
-            try:
-                df[col] = df[col].astype(str).str.strip()
-                # Reemplazar cadenas vacías con NaN
-                df[col] = df[col].replace(['', 'nan', 'None'], None)
-            except Exception as e:
-                st.warning(f"⚠️ Error limpiando columna '{col}': {e}")
+        # Resolver una sola vez qué columna corresponde a cada campo del dashboard
+        df.attrs['col_map'] = resolve_columns(df)
+        
+        # Marca de la carga: identifica estos datos en las cachés derivadas
+        # (texto ISO para que los attrs se puedan serializar al pasar a Arrow/Parquet)
+        df.attrs['loaded_at'] = datetime.now().isoformat()
         
         return df
         
@@ -211,14 +373,13 @@ def clean_dataframe(df):
 
 def show_connection_status():
     """Muestra el estado de la conexión"""
-    if hasattr(st, 'secrets') and 'gcp_service_account' in st.secrets:
+    if has_service_account():
         st.success("✅ Credenciales configuradas correctamente")
         
         # Mostrar información adicional de debug
         with st.expander("🔍 Información de Configuración"):
             try:
-                sheet_id = st.secrets.get("google_sheets", {}).get("sheet_id", "1fbs-J474JbvV3USg5aQlLUW9sNqkBjcd63qBU1nJeeI")
-                worksheet_name = st.secrets.get("google_sheets", {}).get("worksheet_name", "Respuestas de formulario 1")
+                sheet_id, worksheet_name = get_sheet_config()
                 client_email = st.secrets["gcp_service_account"].get("client_email", "No disponible")
                 
                 st.write(f"**Sheet ID:** {sheet_id}")
@@ -249,61 +410,105 @@ def show_connection_status():
             [google_sheets]
             sheet_id = "1fbs-J474JbvV3USg5aQlLUW9sNqkBjcd63qBU1nJeeI"
             worksheet_name = "Respuestas de formulario 1"
+            # Opcional: hoja compartida por enlace, leída por la exportación CSV sin credenciales
+            # public = true
+            # worksheet_gid = 0
             ```
             """)
 
-def find_column_flexible(df, search_terms):
+def lowercase_column_index(df):
+    """Índice {nombre normalizado (sin espacios, en minúsculas): nombre original}, en el orden de la hoja"""
+    index = {}
+    for col in df.columns:
+        index.setdefault(col.strip().lower(), col)
+    return index
+
+def find_column_flexible(df, search_terms, lower_index=None):
     """Busca una columna de forma flexible"""
+    if lower_index is None:
+        lower_index = lowercase_column_index(df)
     for term in search_terms:
         # Búsqueda exacta
         if term in df.columns:
             return term
-        # Búsqueda parcial
-        for col in df.columns:
-            if term.lower() in col.lower():
+        # Búsqueda exacta sin distinguir mayúsculas ni espacios (consulta directa al índice)
+        term_lower = term.strip().lower()
+        if term_lower in lower_index:
+            return lower_index[term_lower]
+        # Búsqueda parcial sobre los nombres ya normalizados
+        for col_lower, col in lower_index.items():
+            if term_lower in col_lower:
                 return col
     return None
 
+def resolve_columns(df):
+    """Busca la columna de cada campo de COLUMN_SEARCH_TERMS"""
+    lower_index = lowercase_column_index(df)
+    return {key: find_column_flexible(df, terms, lower_index) for key, terms in COLUMN_SEARCH_TERMS.items()}
+
+def get_column_map(df):
+    """Devuelve el mapeo de columnas calculado al cargar los datos"""
+    col_map = df.attrs.get('col_map')
+    if col_map is None:
+        col_map = resolve_columns(df)
+    return col_map
+
+def _frame_key(df):
+    """Clave de caché barata para un DataFrame cargado o un filtrado de él"""
+    loaded_at = df.attrs.get('loaded_at')
+    if loaded_at is None:
+        return int(pd.util.hash_pandas_object(df).sum())
+    # Misma carga + mismas filas y columnas = mismos datos, sin recorrer los valores
+    return loaded_at, tuple(df.columns), int(pd.util.hash_array(df.index.to_numpy()).sum())
+
+# Las funciones cacheadas que reciben DataFrames los identifican con _frame_key
+FRAME_HASH_FUNCS = {pd.DataFrame: _frame_key}
+
+# Filtros del sidebar: (campo de COLUMN_SEARCH_TERMS, etiqueta, opción por defecto)
+FILTER_CONFIGS = [
+    ('nombre', '📍 Nombre del Comedor:', 'Todos'),
+    ('barrio', '🏘️ Barrio:', 'Todos'),
+    ('comuna', '🏛️ Comuna:', 'Todas'),
+    ('nodo', '🔗 Nodo:', 'Todos'),
+    ('nicho', '🎯 Nicho:', 'Todos')
+]
+
+@st.cache_data(show_spinner=False, hash_funcs=FRAME_HASH_FUNCS)
+def _filter_options(df):
+    """Calcula una sola vez los valores ordenados de cada columna de filtro"""
+    col_map = get_column_map(df)
+    options = {}
+    for field, _, _ in FILTER_CONFIGS:
+        found_col = col_map[field]
+        if found_col and found_col not in options:
+            options[found_col] = sorted_options(df[found_col])
+    return options
+
 def create_filters_sidebar(df):
     """Crea los filtros en el sidebar"""
     st.sidebar.markdown('<div class="filter-header">🔍 Filtros de Búsqueda</div>', unsafe_allow_html=True)
     
-    # Crear copia para filtros
-    df_filtered = df.copy()
-    
-    # Definir columnas a buscar
-    filter_configs = [
-        (['NOMBRE DEL COMEDOR', 'NOMBRE', 'COMEDOR'], '📍 Nombre del Comedor:', 'Todos'),
-        (['BARRIO'], '🏘️ Barrio:', 'Todos'),
-        (['COMUNA'], '🏛️ Comuna:', 'Todas'),
-        (['NODO ', 'NODO'], '🔗 Nodo:', 'Todos'),
-        (['NICHO ', 'NICHO'], '🎯 Nicho:', 'Todos')
-    ]
+    # Columna real, etiqueta y opción por defecto de cada filtro
+    col_map = get_column_map(df)
+    filter_columns = {}
+    default_options = {}
+    for field, label, default_option in FILTER_CONFIGS:
+        found_col = col_map[field]
+        if found_col and found_col not in filter_columns:
+            filter_columns[found_col] = label
+            default_options[found_col] = default_option
     
-    applied_filters = 0
-    
-    for search_terms, label, default_option in filter_configs:
-        found_col = find_column_flexible(df, search_terms)
-        
-        if found_col:
-            unique_values = [default_option] + sorted([
-                str(x) for x in df_filtered[found_col].dropna().unique() 
-                if str(x) not in ['nan', 'None', '']
-            ])
-            
-            if len(unique_values) > 1:
-                selected = st.sidebar.selectbox(label, unique_values, key=f"filter_{found_col}")
-                
-                if selected != default_option:
-                    df_filtered = df_filtered[df_filtered[found_col].astype(str) == selected]
-                    applied_filters += 1
+    # Valores disponibles por columna (precalculados sobre los datos completos, en caché por carga)
+    df_filtered, applied_filters = apply_sidebar_filters(
+        df, filter_columns, key_prefix="filter_", default_options=default_options, options=_filter_options(df)
+    )
     
     # Mostrar información de filtros aplicados
     st.sidebar.markdown("---")
     st.sidebar.markdown(f"**Registros mostrados:** {len(df_filtered):,} de {len(df):,}")
     
-    if applied_filters > 0:
-        st.sidebar.markdown(f"**Filtros activos:** {applied_filters}")
+    if applied_filters:
+        st.sidebar.markdown(f"**Filtros activos:** {len(applied_filters)}")
     
     # Botón para limpiar filtros
     if st.sidebar.button("🔄 Limpiar Filtros"):
@@ -311,65 +516,33 @@ def create_filters_sidebar(df):
     
     return df_filtered
 
-def show_metrics(df_filtered, df_original):
-    """Muestra las métricas principales"""
-    col1, col2, col3, col4 = st.columns(4)
+@st.cache_data(show_spinner=False, hash_funcs=FRAME_HASH_FUNCS)
+def _distinct_counts(df, columns):
+    """Cuenta los valores distintos de varias columnas en una sola pasada"""
+    return df[list(columns)].nunique(dropna=True).to_dict()
+
+def show_metrics(df_filtered, df_original, n_sel):
+    """Muestra las métricas principales (n_sel: número de registros filtrados)"""
+    col_map = get_column_map(df_original)
+    tipo_col, barrio_col, comuna_col = col_map['tipo'], col_map['barrio'], col_map['comuna']
     
-    with col1:
-        st.markdown("""
-        <div class="metric-card">
-            <h4>Total Comedores</h4>
-            <h2 style="color: #2E7D32;">{:,}</h2>
-        </div>
-        """.format(len(df_filtered)), unsafe_allow_html=True)
+    # Valores distintos de las tres columnas (cacheados por carga y filas filtradas)
+    metric_columns = tuple(dict.fromkeys(c for c in (tipo_col, barrio_col, comuna_col) if c))
+    counts = _distinct_counts(df_filtered, metric_columns)
     
-    with col2:
-        # Buscar columna de tipos dinámicamente
-        tipo_col = find_column_flexible(df_filtered, ['TIPO DE COMEDOR', 'TIPO', 'COMEDOR'])
-        
-        if tipo_col:
-            tipos_activos = len(df_filtered[tipo_col].dropna().unique())
-        else:
-            tipos_activos = 0
-            
-        st.markdown("""
-        <div class="metric-card">
-            <h4>Tipos de Comedores</h4>
-            <h2 style="color: #1976D2;">{}</h2>
-        </div>
-        """.format(tipos_activos), unsafe_allow_html=True)
-    
-    with col3:
-        # Buscar columna de barrios dinámicamente
-        barrio_col = find_column_flexible(df_filtered, ['BARRIO'])
-        
-        if barrio_col:
-            barrios_activos = len(df_filtered[barrio_col].dropna().unique())
-        else:
-            barrios_activos = 0
-            
-        st.markdown("""
-        <div class="metric-card">
-            <h4>Barrios Cubiertos</h4>
-            <h2 style="color: #F57C00;">{}</h2>
-        </div>
-        """.format(barrios_activos), unsafe_allow_html=True)
-    
-    with col4:
-        # Buscar columna de comunas dinámicamente
-        comuna_col = find_column_flexible(df_filtered, ['COMUNA'])
-        
-        if comuna_col:
-            comunas_activas = len(df_filtered[comuna_col].dropna().unique())
-        else:
-            comunas_activas = 0
-            
-        st.markdown("""
-        <div class="metric-card">
-            <h4>Comunas Activas</h4>
-            <h2 style="color: #7B1FA2;">{}</h2>
-        </div>
-        """.format(comunas_activas), unsafe_allow_html=True)
+    col1, col2, col3, col4 = st.columns(4)
+    
+    # st.metric se envía como elemento nativo, sin HTML que sanear e insertar en cada rerun
+    col1.metric("Total Comedores", f"{n_sel:,}")
+    col2.metric("Tipos de Comedores", int(counts[tipo_col]) if tipo_col else 0)
+    col3.metric("Barrios Cubiertos", int(counts[barrio_col]) if barrio_col else 0)
+    col4.metric("Comunas Activas", int(counts[comuna_col]) if comuna_col else 0)
+
+@st.cache_data(show_spinner=False, hash_funcs=FRAME_HASH_FUNCS)
+def _memory_usage_kb(df):
+    """Memoria ocupada por el DataFrame en KB"""
+    # Con columnas Arrow/categóricas/Int64 el cálculo superficial ya es exacto (no recorre celdas)
+    return df.memory_usage(deep=False).sum() / 1024
 
 def show_data_info(df):
     """Muestra información sobre los datos cargados"""
@@ -382,7 +555,7 @@ def show_data_info(df):
         **📊 Resumen de Datos:**
         - **Filas:** {len(df):,}
         - **Columnas:** {len(df.columns)}
-        - **Memoria:** {df.memory_usage(deep=True).sum() / 1024:.1f} KB
+        - **Memoria:** {_memory_usage_kb(df):.1f} KB
         """)
     
     with col2:
@@ -392,6 +565,54 @@ def show_data_info(df):
         - **Fuente:** Google Sheets
         """)
 
+@st.cache_data(show_spinner=False, hash_funcs=FRAME_HASH_FUNCS, max_entries=16)
+def _to_csv(df, columns):
+    """Serializa a CSV (bytes) las columnas seleccionadas del DataFrame"""
+    # Escribir directamente en bytes, sin un str intermedio del tamaño del archivo
+    # (pandas y no el escritor de Arrow: este entrecomilla todos los textos y cambiaría el formato)
+    buffer = io.BytesIO()
+    df[list(columns)].to_csv(buffer, index=False, encoding='utf-8')
+    return buffer.getvalue()
+
+@st.fragment
+def show_data_preview(df_filtered):
+    """Muestra la vista rápida de los datos filtrados y la opción de descarga"""
+    if not df_filtered.empty:
+        # Mostrar las primeras 5 columnas por defecto
+        default_columns = df_filtered.columns[:min(6, len(df_filtered.columns))].tolist()
+        
+        selected_columns = st.multiselect(
+            "Selecciona las columnas a mostrar:",
+            options=df_filtered.columns.tolist(),
+            default=default_columns,
+            help="Selecciona qué información quieres ver en la tabla"
+        )
+        
+        if selected_columns:
+            # Mostrar datos filtrados (solo las primeras filas y las columnas elegidas se envían al navegador)
+            st.dataframe(
+                df_filtered.head(PREVIEW_ROWS)[selected_columns],
+                use_container_width=True,
+                height=400
+            )
+            if len(df_filtered) > PREVIEW_ROWS:
+                st.caption(f"Mostrando las primeras {PREVIEW_ROWS:,} de {len(df_filtered):,} filas. Descarga el CSV para ver todos los datos.")
+            
+            # Opción para descargar datos
+            st.markdown("### 📥 Descargar Datos")
+            csv = _to_csv(df_filtered, tuple(selected_columns))
+            st.download_button(
+                label="📥 Descargar datos filtrados (CSV)",
+                data=csv,
+                file_name=f"comedores_filtrados_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime='text/csv',
+                help="Descarga los datos actuales con los filtros aplicados"
+            )
+        else:
+            st.info("👆 Selecciona al menos una columna para mostrar los datos.")
+    else:
+        st.warning("No hay datos para mostrar con los filtros aplicados.")
+
 # Función principal
 def main():
     # Título principal
@@ -400,9 +621,14 @@ def main():
     # Mostrar estado de conexión
     show_connection_status()
     
-    # Cargar datos
+    # Cargar datos: por la exportación CSV si la hoja está configurada como pública
+    # y, si no (o si falla), con la cuenta de servicio
+    sheet_id, worksheet_name = get_sheet_config()
+    public_gid = get_public_worksheet_gid()
     with st.spinner('Cargando datos desde Google Sheets...'):
-        df = load_data_secure()
+        df = load_data_csv(sheet_id, public_gid) if public_gid is not None else None
+        if df is None:
+            df = load_data_with_fallback(sheet_id, worksheet_name)
     
     if df is None:
         st.error("❌ No se pudieron cargar los datos.")
@@ -417,10 +643,12 @@ def main():
         return
     
     # Información básica de los datos
-    st.success(f"📊 **Datos cargados exitosamente:** {len(df):,} registros encontrados")
+    n_all = len(df)
+    st.success(f"📊 **Datos cargados exitosamente:** {n_all:,} registros encontrados")
     
     # NUEVO: Mostrar las primeras columnas para debug
-    with st.expander("🔍 Vista previa de datos"):
+    # (solo si se pide: el contenido de un expander se envía al navegador aunque esté cerrado)
+    if st.checkbox("🔍 Vista previa de datos", key="show_preview"):
         st.write("**Primeras 5 filas:**")
         st.dataframe(df.head())
         st.write("**Nombres de columnas:**")
@@ -431,17 +659,18 @@ def main():
     
     # Crear filtros en sidebar
     df_filtered = create_filters_sidebar(df)
+    n_sel = len(df_filtered)
     
     # Mostrar métricas principales
-    show_metrics(df_filtered, df)
+    show_metrics(df_filtered, df, n_sel)
     
     st.markdown("---")
     
     # Información sobre filtros aplicados
-    if len(df_filtered) != len(df):
+    if n_sel != n_all:
         st.markdown("## 🔍 Filtros Aplicados")
         st.info(f"""
-        **Datos filtrados:** Se están mostrando {len(df_filtered):,} de {len(df):,} registros totales.
+        **Datos filtrados:** Se están mostrando {n_sel:,} de {n_all:,} registros totales.
         
         Los filtros aplicados afectan todas las visualizaciones y análisis en las páginas del dashboard.
         """)
@@ -449,39 +678,7 @@ def main():
     # Sección de vista rápida de datos
     st.markdown("## 👀 Vista Rápida de Datos")
     
-    if not df_filtered.empty:
-        # Mostrar las primeras 5 columnas por defecto
-        default_columns = df_filtered.columns[:min(6, len(df_filtered.columns))].tolist()
-        
-        selected_columns = st.multiselect(
-            "Selecciona las columnas a mostrar:",
-            options=df_filtered.columns.tolist(),
-            default=default_columns,
-            help="Selecciona qué información quieres ver en la tabla"
-        )
-        
-        if selected_columns:
-            # Mostrar datos filtrados
-            st.dataframe(
-                df_filtered[selected_columns],
-                use_container_width=True,
-                height=400
-            )
-            
-            # Opción para descargar datos
-            st.markdown("### 📥 Descargar Datos")
-            csv = df_filtered[selected_columns].to_csv(index=False)
-            st.download_button(
-                label="📥 Descargar datos filtrados (CSV)",
-                data=csv,
-                file_name=f"comedores_filtrados_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime='text/csv',
-                help="Descarga los datos actuales con los filtros aplicados"
-            )
-        else:
-            st.info("👆 Selecciona al menos una columna para mostrar los datos.")
-    else:
-        st.warning("No hay datos para mostrar con los filtros aplicados.")
+    show_data_preview(df_filtered)
     
     # Footer
     st.markdown("---")
@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import numpy as np
 import plotly.graph_objects as go
 from datetime import datetime
 import sys
@@ -24,8 +24,11 @@ try:
 except ImportError:
     modules_loaded = False
 
+# Funciones compartidas por las páginas (opciones múltiples y filtros)
+from utils.page_helpers import parse_multiple_options, resolve_filter_columns, apply_sidebar_filters
+
 # CSS personalizado
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     .page-header {
         font-size: 2.2rem;
@@ -87,37 +90,37 @@ st.markdown("""
         border-left: 3px solid #FFC107;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.html(CUSTOM_CSS)
 
-def find_problematicas_column(df):
+# Filtros del sidebar: columna esperada -> etiqueta
+EXPECTED_FILTER_COLUMNS = {
+    'BARRIO': '🏘️ Barrio', 
+    'COMUNA': '🏛️ Comuna',
+    'NODO ': '🔗 Nodo',
+    'NICHO ': '🎯 Nicho'
+}
+
+def find_problematicas_column(columns):
     """Busca la columna de problemáticas"""
-    if df is None:
-        return None
-    
     possible_names = ['PROBLEMÁTICAS', 'PROBLEMATICAS', 'PROBLEMAS', 'DIFICULTADES', 'OBSTÁCULOS']
     
     # Buscar exacto
     for name in possible_names:
-        if name in df.columns:
+        if name in columns:
             return name
     
     # Buscar parcial
-    for col in df.columns:
+    for col in columns:
         if 'problem' in col.lower():
             return col
     
     return None
 
-def parse_multiple_options(data_series):
-    """Parsea opciones múltiples separadas por comas"""
-    all_options = []
-    for entry in data_series.dropna():
-        if pd.isna(entry) or entry == '' or str(entry).lower() in ['nan', 'none']:
-            continue
-        options = [opt.strip() for opt in str(entry).split(',')]
-        options = [opt for opt in options if opt and opt.lower() not in ['nan', 'none', '']]
-        all_options.extend(options)
-    return all_options
+# Cortes de severidad por porcentaje de menciones: <3% baja, 3-8% media, 8-15% alta, ≥15% crítica
+SEVERITY_BINS = [-float('inf'), 3, 8, 15, float('inf')]
+SEVERITY_LABELS = ['⚪ Baja', '🟡 Media', '🟠 Alta', '🔴 Crítica']
+SEVERITY_ICONS = ['⚪', '🟡', '🟠', '🔴']
 
 def categorize_problematicas(problematicas_counts):
     """Categoriza problemáticas por nivel de severidad"""
@@ -140,12 +143,17 @@ def categorize_problematicas(problematicas_counts):
     
     return critical, high, medium, low
 
-def analyze_problematicas(df):
+@st.cache_data(show_spinner=False, max_entries=32)
+def count_problematicas(valid_data):
+    """Cuenta las menciones de cada problemática (en caché según el contenido de la columna)"""
+    all_problematicas = parse_multiple_options(valid_data)
+    return all_problematicas.value_counts(), len(all_problematicas)
+
+def analyze_problematicas(df, problematicas_col):
     """Analiza las problemáticas identificadas"""
     if df is None or df.empty:
         return None, None, None
     
-    problematicas_col = find_problematicas_column(df)
     if not problematicas_col:
         return None, None, "❌ No se encontró la columna 'PROBLEMÁTICAS'"
     
@@ -153,12 +161,11 @@ def analyze_problematicas(df):
     if valid_data.empty:
         return None, None, "⚠️ No hay datos válidos en la columna de problemáticas"
     
-    all_problematicas = parse_multiple_options(valid_data)
-    if not all_problematicas:
+    # Los filtros que no cambian esta columna reutilizan el conteo anterior
+    problematicas_counts, total_menciones = count_problematicas(valid_data)
+    if total_menciones == 0:
         return None, None, "⚠️ No se pudieron extraer problemáticas válidas"
     
-    problematicas_counts = pd.Series(all_problematicas).value_counts()
-    total_menciones = len(all_problematicas)
     comedores_con_problematicas = len(valid_data)
     total_comedores = len(df)
     
@@ -185,41 +192,23 @@ def analyze_problematicas(df):
 **Top 8 Problemáticas Más Frecuentes:**
 """
     
-    for problematica, count in problematicas_counts.head(8).items():
-        percentage = (count / total_menciones) * 100
-        if percentage >= 15:
-            severity = "🔴"
-        elif percentage >= 8:
-            severity = "🟠"
-        elif percentage >= 3:
-            severity = "🟡"
-        else:
-            severity = "⚪"
-        analysis_text += f"\n- {severity} **{problematica}:** {count:,} ({percentage:.1f}%)"
+    # Severidad de las 8 principales asignada en bloque
+    top_8 = problematicas_counts.head(8)
+    top_pct = top_8 / total_menciones * 100
+    severities = pd.cut(top_pct, bins=SEVERITY_BINS, right=False, labels=SEVERITY_ICONS)
+    analysis_text += "".join(
+        f"\n- {severity} **{problematica}:** {count:,} ({percentage:.1f}%)"
+        for problematica, count, percentage, severity in zip(top_8.index, top_8.values, top_pct.values, severities)
+    )
     
     return problematicas_counts, problematicas_col, analysis_text
 
 def create_filters_sidebar(df):
     """Crea filtros en sidebar"""
     st.sidebar.markdown("### 🔍 Filtros")
-    df_filtered = df.copy()
-    
-    filters = {
-        'BARRIO': '🏘️ Barrio', 
-        'COMUNA': '🏛️ Comuna',
-        'NODO ': '🔗 Nodo',
-        'NICHO ': '🎯 Nicho'
-    }
-    
-    for col, label in filters.items():
-        found_col = col if col in df.columns else next((c for c in df.columns if col.lower().replace(' ', '') in c.lower().replace(' ', '')), None)
-        
-        if found_col and found_col in df_filtered.columns:
-            values = ['Todos'] + sorted([str(x) for x in df_filtered[found_col].dropna().unique() if str(x) != 'nan'])
-            if len(values) > 1:
-                selected = st.sidebar.selectbox(label, values, key=f"f_{col}")
-                if selected != 'Todos':
-                    df_filtered = df_filtered[df_filtered[found_col].astype(str) == selected]
+    # Columnas de filtro resueltas una sola vez por encabezados (en caché)
+    filter_columns = resolve_filter_columns(tuple(df.columns), EXPECTED_FILTER_COLUMNS)
+    df_filtered, _ = apply_sidebar_filters(df, filter_columns, key_prefix="f_")
     
     st.sidebar.markdown(f"**Registros:** {len(df_filtered):,}/{len(df):,}")
     if st.sidebar.button("🔄 Limpiar"):
@@ -243,21 +232,15 @@ def create_horizontal_bar_chart(problematicas_counts):
     
     # Colores por severidad
     total = problematicas_counts.sum()
-    colors = []
-    
-    for i, (name, count) in enumerate(chart_data.items()):
-        if name == 'Otros':
-            colors.append('#757575')  # Gris para "Otros"
-        else:
-            pct = (count / total) * 100
-            if pct >= 15:
-                colors.append('#D32F2F')  # Rojo - Crítica
-            elif pct >= 8:
-                colors.append('#F57C00')  # Naranja - Alta
-            elif pct >= 3:
-                colors.append('#FBC02D')  # Amarillo - Media
-            else:
-                colors.append('#9E9E9E')  # Gris - Baja
+    pct = chart_data.values / total * 100
+    colors = np.select(
+        [chart_data.index == 'Otros', pct >= 15, pct >= 8, pct >= 3],
+        ['#757575',  # Gris para "Otros"
+         '#D32F2F',  # Rojo - Crítica
+         '#F57C00',  # Naranja - Alta
+         '#FBC02D'], # Amarillo - Media
+        default='#9E9E9E'  # Gris - Baja
+    ).tolist()
     
     # Crear el gráfico
     fig = go.Figure()
@@ -269,7 +252,7 @@ def create_horizontal_bar_chart(problematicas_counts):
         text=chart_data.values,
         textposition='outside',
         hovertemplate='<b>%{y}</b><br>Menciones: %{x}<br>%{customdata:.1f}%<extra></extra>',
-        customdata=[(c/total)*100 for c in chart_data.values]
+        customdata=pct
     ))
     
     fig.update_layout(
@@ -285,110 +268,38 @@ def create_horizontal_bar_chart(problematicas_counts):
     fig.update_xaxes(showgrid=True, gridcolor='rgba(0,0,0,0.1)')
     fig.update_yaxes(showgrid=False, autorange="reversed")
     
-    return fig       # Tomar solo las top 8 problemáticas
-    top_8 = problematicas_counts.head(8)
-    
-    # Calcular "Otros" si hay más de 8 problemáticas
-    if len(problematicas_counts) > 8:
-        otros_count = problematicas_counts.iloc[8:].sum()
-        # Crear nueva serie con Top 8 + Otros
-        chart_data = pd.concat([top_8, pd.Series([otros_count], index=['Otros'])])
-    else:
-        chart_data = top_8
-    
-    # Colores por severidad
-    total = problematicas_counts.sum()
-    colors = []
-    
-    for i, (name, count) in enumerate(chart_data.items()):
-        if name == 'Otros':
-            colors.append('#757575')  # Gris para "Otros"
-        else:
-            pct = (count / total) * 100
-            if pct >= 15:
-                colors.append('#D32F2F')  # Rojo - Crítica
-            elif pct >= 8:
-                colors.append('#F57C00')  # Naranja - Alta
-            elif pct >= 3:
-                colors.append('#FBC02D')  # Amarillo - Media
-            else:
-                colors.append('#9E9E9E')  # Gris - Baja
-    
-    # Crear el gráfico
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        y=chart_data.index,
-        x=chart_data.values,
-        orientation='h',
-        marker=dict(color=colors, line=dict(color='rgba(0,0,0,0.1)', width=1)),
-        text=chart_data.values,
-        textposition='outside',
-        hovertemplate='<b>%{y}</b><br>Menciones: %{x}<br>%{customdata:.1f}%<extra></extra>',
-        customdata=[(c/total)*100 for c in chart_data.values]
-    ))
-    
-    fig.update_layout(
-        title={'text': "⚠️ Top 8 Problemáticas + Otros", 'x': 0.5, 'font': {'size': 18, 'color': '#E65100'}},
-        xaxis_title="Número de Menciones", 
-        yaxis_title="Problemáticas Identificadas",
-        height=500,  # Altura fija para 9 elementos máximo
-        showlegend=False,
-        plot_bgcolor='rgba(0,0,0,0)', 
-        margin=dict(l=20, r=80, t=60, b=40)
-    )
-    
-    fig.update_xaxes(showgrid=True, gridcolor='rgba(0,0,0,0.1)')
-    fig.update_yaxes(showgrid=False, autorange="reversed")
-    
     return fig
 
 def create_summary_table(problematicas_counts):
     """Crea tabla resumen con severidades"""
-    total = problematicas_counts.sum()
-    severities = []
-    
-    for count in problematicas_counts.values:
-        pct = (count / total) * 100
-        if pct >= 15:
-            severities.append('🔴 Crítica')
-        elif pct >= 8:
-            severities.append('🟠 Alta')
-        elif pct >= 3:
-            severities.append('🟡 Media')
-        else:
-            severities.append('⚪ Baja')
+    # Porcentajes y severidades calculados sobre toda la serie a la vez
+    pct = problematicas_counts / problematicas_counts.sum() * 100
+    severities = pd.cut(pct, bins=SEVERITY_BINS, right=False, labels=SEVERITY_LABELS)
     
     return pd.DataFrame({
         'Problemática': problematicas_counts.index,
         'Menciones': problematicas_counts.values,
-        'Porcentaje': [f"{(c/total)*100:.1f}%" for c in problematicas_counts.values],
-        'Severidad': severities,
+        'Porcentaje': pct.map('{:.1f}%'.format).values,
+        'Severidad': severities.astype(str).values,
         'Ranking': range(1, len(problematicas_counts) + 1)
     })
 
-def main():
-    # Header
-    st.markdown('<div class="page-header">⚠️ Problemáticas</div>', unsafe_allow_html=True)
-    
-    # Cargar datos
-    with st.spinner('🔄 Cargando datos...'):
-        df = load_data_from_sheets() if modules_loaded else None
-    
-    if df is None:
-        st.error("❌ No se pudieron cargar los datos")
-        return
-    
-    # Info básica
-    st.markdown(f"""
-    <div class="metric-container">
-        <h4>📊 Sistema Operativo</h4>
-        <p><strong>Registros:</strong> {len(df):,} | <strong>Actualización:</strong> {datetime.now().strftime('%d/%m/%Y %H:%M')}</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Filtros y análisis
-    df_filtered = create_filters_sidebar(df)
-    problematicas_counts, problematicas_col, analysis_text = analyze_problematicas(df_filtered)
+@st.cache_data(show_spinner=False, max_entries=16)
+def summary_to_csv(summary_df):
+    """Serializa la tabla resumen a CSV (bytes), reutilizado entre recargas"""
+    return summary_df.to_csv(index=False).encode('utf-8')
+
+def severity_items_html(items, css_class, total, limit):
+    """Arma en un solo bloque HTML las primeras problemáticas de un nivel de severidad"""
+    return ''.join(
+        f'<div class="{css_class}"><strong>{problematica}:</strong> {count:,} ({count / total * 100:.1f}%)</div>'
+        for problematica, count in list(items.items())[:limit]
+    )
+
+@st.fragment
+def analysis_view(df_filtered, problematicas_col):
+    """Análisis, gráfico y pestañas sobre los datos filtrados"""
+    problematicas_counts, problematicas_col, analysis_text = analyze_problematicas(df_filtered, problematicas_col)
     
     if problematicas_counts is None:
         st.error("❌ No se pudo analizar la columna de problemáticas")
@@ -396,6 +307,10 @@ def main():
             st.info(analysis_text)
         return
     
+    # Totales y severidades calculados una sola vez para métricas, gráfico y análisis
+    total = problematicas_counts.sum()
+    critical, high, medium, low = categorize_problematicas(problematicas_counts)
+    
     # Pestañas
     tab1, tab2 = st.tabs(["📊 Gráfico de Barras", "📋 Análisis Detallado"])
     
@@ -405,14 +320,13 @@ def main():
         # Métricas
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Total Menciones", f"{problematicas_counts.sum():,}")
+            st.metric("Total Menciones", f"{total:,}")
         with col2:
             st.metric("Problemáticas Únicas", f"{len(problematicas_counts)}")
         with col3:
-            critical, high, medium, low = categorize_problematicas(problematicas_counts)
             st.metric("Críticas", f"{len(critical)}")
         with col4:
-            principal_pct = (problematicas_counts.iloc[0] / problematicas_counts.sum()) * 100 if len(problematicas_counts) > 0 else 0
+            principal_pct = (problematicas_counts.iloc[0] / total) * 100 if len(problematicas_counts) > 0 else 0
             st.metric("Principal", f"{principal_pct:.1f}%")
         
         st.markdown("---")
@@ -434,7 +348,7 @@ def main():
             st.dataframe(summary_df, use_container_width=True, hide_index=True)
             
             # Descarga
-            csv = summary_df.to_csv(index=False)
+            csv = summary_to_csv(summary_df)
             st.download_button(
                 "📥 Descargar CSV", csv,
                 file_name=f"problematicas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
@@ -455,41 +369,23 @@ def main():
                 # Análisis por severidades
                 st.markdown("### ⚠️ Análisis por Severidades")
                 
-                critical, high, medium, low = categorize_problematicas(problematicas_counts)
-                
                 col1, col2 = st.columns(2)
                 
                 with col1:
                     st.markdown("**🔴 Problemáticas Críticas:**")
                     if critical:
-                        for problematica, count in list(critical.items())[:4]:
-                            pct = (count / problematicas_counts.sum()) * 100
-                            st.markdown(f"""
-                            <div class="severity-critical">
-                                <strong>{problematica}:</strong> {count:,} ({pct:.1f}%)
-                            </div>
-                            """, unsafe_allow_html=True)
+                        st.markdown(severity_items_html(critical, 'severity-critical', total, 4), unsafe_allow_html=True)
                     else:
                         st.info("✅ No hay problemáticas críticas identificadas")
                     
                     st.markdown("**🟠 Problemáticas de Alta Severidad:**")
-                    for problematica, count in list(high.items())[:3]:
-                        pct = (count / problematicas_counts.sum()) * 100
-                        st.markdown(f"""
-                        <div class="severity-high">
-                            <strong>{problematica}:</strong> {count:,} ({pct:.1f}%)
-                        </div>
-                        """, unsafe_allow_html=True)
+                    if high:
+                        st.markdown(severity_items_html(high, 'severity-high', total, 3), unsafe_allow_html=True)
                 
                 with col2:
                     st.markdown("**🟡 Problemáticas de Media Severidad:**")
-                    for problematica, count in list(medium.items())[:4]:
-                        pct = (count / problematicas_counts.sum()) * 100
-                        st.markdown(f"""
-                        <div class="severity-medium">
-                            <strong>{problematica}:</strong> {count:,} ({pct:.1f}%)
-                        </div>
-                        """, unsafe_allow_html=True)
+                    if medium:
+                        st.markdown(severity_items_html(medium, 'severity-medium', total, 4), unsafe_allow_html=True)
                 
                 # Estadísticas
                 st.markdown("### 📈 Estadísticas y Concentración")
@@ -504,7 +400,6 @@ def main():
                     """, unsafe_allow_html=True)
                 
                 with col_b:
-                    total = problematicas_counts.sum()
                     top3_pct = (problematicas_counts.head(3).sum() / total) * 100
                     top5_pct = (problematicas_counts.head(5).sum() / total) * 100
                     st.markdown(f"""
@@ -535,5 +430,31 @@ def main():
         
         st.markdown('</div>', unsafe_allow_html=True)
 
+def main():
+    # Header
+    st.markdown('<div class="page-header">⚠️ Problemáticas</div>', unsafe_allow_html=True)
+    
+    # Cargar datos
+    with st.spinner('🔄 Cargando datos...'):
+        df = load_data_from_sheets() if modules_loaded else None
+    
+    if df is None:
+        st.error("❌ No se pudieron cargar los datos")
+        return
+    
+    # Info básica
+    st.markdown(f"""
+    <div class="metric-container">
+        <h4>📊 Sistema Operativo</h4>
+        <p><strong>Registros:</strong> {len(df):,} | <strong>Actualización:</strong> {datetime.now().strftime('%d/%m/%Y %H:%M')}</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Filtros en el sidebar, fuera del fragmento (un fragmento no puede escribir en st.sidebar)
+    df_filtered = create_filters_sidebar(df)
+    
+    # Análisis: las interacciones dentro de él (p. ej. la descarga) solo vuelven a ejecutar el fragmento
+    analysis_view(df_filtered, find_problematicas_column(df.columns))
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
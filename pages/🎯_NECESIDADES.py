@@ -1,6 +1,5 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 import sys
@@ -24,8 +23,11 @@ try:
 except ImportError:
     modules_loaded = False
 
+# Funciones compartidas por las páginas (opciones múltiples y filtros)
+from utils.page_helpers import parse_multiple_options, resolve_filter_columns, apply_sidebar_filters
+
 # CSS personalizado
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     .page-header {
         font-size: 2.2rem;
@@ -80,7 +82,8 @@ st.markdown("""
         border-left: 3px solid #FF9800;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.html(CUSTOM_CSS)
 
 def find_necesidades_column(df):
     """Busca la columna de necesidades"""
@@ -101,17 +104,6 @@ def find_necesidades_column(df):
     
     return None
 
-def parse_multiple_options(data_series):
-    """Parsea opciones múltiples separadas por comas"""
-    all_options = []
-    for entry in data_series.dropna():
-        if pd.isna(entry) or entry == '' or str(entry).lower() in ['nan', 'none']:
-            continue
-        options = [opt.strip() for opt in str(entry).split(',')]
-        options = [opt for opt in options if opt and opt.lower() not in ['nan', 'none', '']]
-        all_options.extend(options)
-    return all_options
-
 def categorize_necesidades(necesidades_counts):
     """Categoriza necesidades por nivel de prioridad"""
     total = necesidades_counts.sum()
@@ -144,10 +136,10 @@ def analyze_necesidades(df):
         return None, None, "⚠️ No hay datos válidos en la columna de necesidades"
     
     all_necesidades = parse_multiple_options(valid_data)
-    if not all_necesidades:
+    if all_necesidades.empty:
         return None, None, "⚠️ No se pudieron extraer necesidades válidas"
     
-    necesidades_counts = pd.Series(all_necesidades).value_counts()
+    necesidades_counts = all_necesidades.value_counts()
     total_menciones = len(all_necesidades)
     comedores_con_necesidades = len(valid_data)
     total_comedores = len(df)
@@ -181,27 +173,20 @@ def analyze_necesidades(df):
     
     return necesidades_counts, necesidades_col, analysis_text
 
+# Columnas de filtro del sidebar (columna esperada -> etiqueta)
+EXPECTED_FILTER_COLUMNS = {
+    'BARRIO': '🏘️ Barrio', 
+    'COMUNA': '🏛️ Comuna',
+    'NODO ': '🔗 Nodo',
+    'NICHO ': '🎯 Nicho'
+}
+
 def create_filters_sidebar(df):
     """Crea filtros en sidebar"""
     st.sidebar.markdown("### 🔍 Filtros")
-    df_filtered = df.copy()
-    
-    filters = {
-        'BARRIO': '🏘️ Barrio', 
-        'COMUNA': '🏛️ Comuna',
-        'NODO ': '🔗 Nodo',
-        'NICHO ': '🎯 Nicho'
-    }
-    
-    for col, label in filters.items():
-        found_col = col if col in df.columns else next((c for c in df.columns if col.lower().replace(' ', '') in c.lower().replace(' ', '')), None)
-        
-        if found_col and found_col in df_filtered.columns:
-            values = ['Todos'] + sorted([str(x) for x in df_filtered[found_col].dropna().unique() if str(x) != 'nan'])
-            if len(values) > 1:
-                selected = st.sidebar.selectbox(label, values, key=f"f_{col}")
-                if selected != 'Todos':
-                    df_filtered = df_filtered[df_filtered[found_col].astype(str) == selected]
+    # Columnas de filtro resueltas una sola vez por encabezados (en caché)
+    filter_columns = resolve_filter_columns(tuple(df.columns), EXPECTED_FILTER_COLUMNS)
+    df_filtered, _ = apply_sidebar_filters(df, filter_columns, key_prefix="f_")
     
     st.sidebar.markdown(f"**Registros:** {len(df_filtered):,}/{len(df):,}")
     if st.sidebar.button("🔄 Limpiar"):
@@ -316,14 +301,14 @@ def create_horizontal_bar_chart(necesidades_counts):
                                             
 def create_summary_table(necesidades_counts):
     """Crea tabla resumen con prioridades"""
-    total = necesidades_counts.sum()
+    # Porcentajes calculados sobre toda la serie a la vez
+    pct = necesidades_counts / necesidades_counts.sum() * 100
     priorities = []
     
-    for count in necesidades_counts.values:
-        pct = (count / total) * 100
-        if pct >= 10:
+    for value in pct.values:
+        if value >= 10:
             priorities.append('🔴 Alta')
-        elif pct >= 3:
+        elif value >= 3:
             priorities.append('🟡 Media')
         else:
             priorities.append('⚪ Baja')
@@ -331,8 +316,7 @@ def create_summary_table(necesidades_counts):
     return pd.DataFrame({
         'Necesidad': necesidades_counts.index,
         'Menciones': necesidades_counts.values,
-        'Porcentaje': [f"{(c/total)*100:.1f}%" for
-                       c in necesidades_counts.values],
+        'Porcentaje': pct.map('{:.1f}%'.format).values,
         'Prioridad': priorities,
         'Ranking': range(1, len(necesidades_counts) + 1)
     })
@@ -367,6 +351,10 @@ def main():
             st.info(analysis_text)
         return
     
+    # Totales y prioridades calculados una sola vez para métricas, gráfico y análisis
+    total = necesidades_counts.sum()
+    high, medium, low = categorize_necesidades(necesidades_counts)
+    
     # Pestañas
     tab1, tab2 = st.tabs(["📊 Gráfico de Barras", "📋 Análisis Detallado"])
     
@@ -376,14 +364,13 @@ def main():
         # Métricas
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Total Menciones", f"{necesidades_counts.sum():,}")
+            st.metric("Total Menciones", f"{total:,}")
         with col2:
             st.metric("Necesidades Únicas", f"{len(necesidades_counts)}")
         with col3:
-            high, medium, low = categorize_necesidades(necesidades_counts)
             st.metric("Alta Prioridad", f"{len(high)}")
         with col4:
-            principal_pct = (necesidades_counts.iloc[0] / necesidades_counts.sum()) * 100 if len(necesidades_counts) > 0 else 0
+            principal_pct = (necesidades_counts.iloc[0] / total) * 100 if len(necesidades_counts) > 0 else 0
             st.metric("Necesidad Principal", f"{principal_pct:.1f}%")
         
         st.markdown("---")
@@ -426,14 +413,12 @@ def main():
                 # Análisis por prioridades
                 st.markdown("### 🎯 Análisis por Prioridades")
                 
-                high, medium, low = categorize_necesidades(necesidades_counts)
-                
                 col1, col2 = st.columns(2)
                 
                 with col1:
                     st.markdown("**🔴 Necesidades de Alta Prioridad:**")
                     for necesidad, count in list(high.items())[:5]:
-                        pct = (count / necesidades_counts.sum()) * 100
+                        pct = (count / total) * 100
                         st.markdown(f"""
                         <div class="priority-high">
                             <strong>{necesidad}:</strong> {count:,} ({pct:.1f}%)
@@ -443,7 +428,7 @@ def main():
                 with col2:
                     st.markdown("**🟡 Necesidades de Media Prioridad:**")
                     for necesidad, count in list(medium.items())[:5]:
-                        pct = (count / necesidades_counts.sum()) * 100
+                        pct = (count / total) * 100
                         st.markdown(f"""
                         <div class="priority-medium">
                             <strong>{necesidad}:</strong> {count:,} ({pct:.1f}%)
@@ -462,7 +447,6 @@ def main():
                     """, unsafe_allow_html=True)
                 
                 with col_b:
-                    total = necesidades_counts.sum()
                     top5_pct = (necesidades_counts.head(5).sum() / total) * 100
                     st.markdown(f"""
                     <div class="highlight-stat"><strong>Top 5:</strong> {top5_pct:.1f}%</div>
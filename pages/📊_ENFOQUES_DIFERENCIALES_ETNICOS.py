@@ -26,8 +26,11 @@ try:
 except ImportError:
     modules_loaded = False
 
+# Funciones compartidas por las páginas (opciones múltiples y filtros)
+from utils.page_helpers import parse_multiple_options, resolve_filter_columns, apply_sidebar_filters
+
 # CSS personalizado para esta página
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     .page-header {
         font-size: 2.2rem;
@@ -68,7 +71,12 @@ st.markdown("""
         border-left: 3px solid #4CAF50;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.html(CUSTOM_CSS)
+
+# Patrones para el análisis de palabras frecuentes (compilados una sola vez)
+WORD_PATTERN = re.compile(r'\b\w+\b')
+STOPWORDS = frozenset(['de', 'en', 'la', 'el', 'y', 'a', 'con', 'del', 'las', 'los', 'para'])
 
 def find_enfoques_column(df):
     """Busca la columna de enfoques diferenciales en el DataFrame"""
@@ -90,27 +98,12 @@ def find_enfoques_column(df):
     
     # Buscar parcial
     for col in df.columns:
-        if 'enfoque' in col.lower() and ('diferencial' in col.lower() or 'etnico' in col.lower() or 'étnico' in col.lower()):
+        col_lower = col.lower()
+        if 'enfoque' in col_lower and ('diferencial' in col_lower or 'etnico' in col_lower or 'étnico' in col_lower):
             return col
     
     return None
 
-def parse_multiple_options(data_series):
-    """Parsea opciones múltiples separadas por comas"""
-    all_options = []
-    
-    for entry in data_series.dropna():
-        if pd.isna(entry) or entry == '' or str(entry).lower() in ['nan', 'none']:
-            continue
-        
-        # Dividir por comas y limpiar
-        options = [opt.strip() for opt in str(entry).split(',')]
-        # Filtrar opciones vacías
-        options = [opt for opt in options if opt and opt.lower() not in ['nan', 'none', '']]
-        all_options.extend(options)
-    
-    return all_options
-
 def analyze_enfoques_diferenciales(df):
     """Analiza los enfoques diferenciales/étnicos"""
     if df is None or df.empty:
@@ -131,11 +124,11 @@ def analyze_enfoques_diferenciales(df):
     # Parsear opciones múltiples
     all_enfoques = parse_multiple_options(valid_data)
     
-    if not all_enfoques:
+    if all_enfoques.empty:
         return None, None, "⚠️ No se pudieron extraer enfoques válidos de los datos"
     
     # Contar frecuencias
-    enfoques_counts = pd.Series(all_enfoques).value_counts()
+    enfoques_counts = all_enfoques.value_counts()
     
     # Calcular estadísticas
     total_menciones = len(all_enfoques)
@@ -193,50 +186,24 @@ def analyze_enfoques_diferenciales(df):
     
     return enfoques_counts, enfoques_col, analysis_text
 
+# Columnas de filtro del sidebar (columna esperada -> etiqueta)
+EXPECTED_FILTER_COLUMNS = {
+    'NOMBRE DEL COMEDOR': '📍 Nombre del Comedor',
+    'BARRIO': '🏘️ Barrio',
+    'COMUNA': '🏛️ Comuna',
+    'NODO ': '🔗 Nodo',
+    'NICHO ': '🎯 Nicho'
+}
+
 def create_filters_sidebar(df):
     """Crea los filtros en el sidebar"""
     st.sidebar.markdown("### 🔍 Filtros de Búsqueda")
     
-    df_filtered = df.copy()
-    
-    # Mapeo de columnas esperadas
-    column_mapping = {
-        'NOMBRE DEL COMEDOR': '📍 Nombre del Comedor',
-        'BARRIO': '🏘️ Barrio',
-        'COMUNA': '🏛️ Comuna',
-        'NODO ': '🔗 Nodo',
-        'NICHO ': '🎯 Nicho'
-    }
-    
-    # Buscar columnas que existen
-    filter_columns = {}
-    for expected_col, label in column_mapping.items():
-        found_col = None
-        
-        if expected_col in df.columns:
-            found_col = expected_col
-        else:
-            for col in df.columns:
-                if expected_col.lower().replace(' ', '') in col.lower().replace(' ', ''):
-                    found_col = col
-                    break
-        
-        if found_col:
-            filter_columns[found_col] = label
+    # Columnas de filtro resueltas una sola vez por encabezados (en caché)
+    filter_columns = resolve_filter_columns(tuple(df.columns), EXPECTED_FILTER_COLUMNS)
     
     # Crear filtros dinámicamente
-    applied_filters = {}
-    
-    for col, label in filter_columns.items():
-        if col in df_filtered.columns:
-            unique_values = ['Todos'] + sorted([str(x) for x in df_filtered[col].dropna().unique() if str(x) != 'nan'])
-            
-            if len(unique_values) > 1:
-                selected = st.sidebar.selectbox(label, unique_values, key=f"filter_{col}")
-                
-                if selected != 'Todos':
-                    df_filtered = df_filtered[df_filtered[col].astype(str) == selected]
-                    applied_filters[col] = selected
+    df_filtered, applied_filters = apply_sidebar_filters(df, filter_columns, key_prefix="filter_")
     
     # Información de filtros
     st.sidebar.markdown("---")
@@ -393,7 +360,7 @@ def create_summary_table(enfoques_counts):
     summary_df = pd.DataFrame({
         'Enfoque Poblacional': enfoques_counts.index,
         'Menciones': enfoques_counts.values,
-        'Porcentaje': [f"{(count/total_menciones)*100:.1f}%" for count in enfoques_counts.values],
+        'Porcentaje': (enfoques_counts / total_menciones * 100).map('{:.1f}%'.format).values,
         'Ranking': range(1, len(enfoques_counts) + 1)
     })
     
@@ -557,12 +524,12 @@ def main():
                 # Buscar patrones comunes en los nombres
                 all_words = []
                 for enfoque in enfoques_counts.index:
-                    words = re.findall(r'\b\w+\b', enfoque.lower())
+                    words = WORD_PATTERN.findall(enfoque.lower())
                     all_words.extend(words)
                 
                 word_counts = Counter(all_words)
                 common_words = [word for word, count in word_counts.most_common(10) 
-                              if word not in ['de', 'en', 'la', 'el', 'y', 'a', 'con', 'del', 'las', 'los', 'para']]
+                              if word not in STOPWORDS]
                 
                 if common_words:
                     st.markdown("**Palabras más frecuentes en los enfoques:**")
@@ -25,8 +25,11 @@ try:
 except ImportError:
     modules_loaded = False
 
+# Funciones compartidas por las páginas (opciones múltiples y filtros)
+from utils.page_helpers import parse_multiple_options, resolve_filter_columns, apply_sidebar_filters
+
 # CSS personalizado
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     .page-header {
         font-size: 2.2rem;
@@ -74,7 +77,8 @@ st.markdown("""
         border-left: 3px solid #7B1FA2;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.html(CUSTOM_CSS)
 
 def find_otras_categorias_column(df):
     """Busca la columna de otras categorías"""
@@ -95,22 +99,12 @@ def find_otras_categorias_column(df):
     
     # Buscar parcial
     for col in df.columns:
-        if 'otras' in col.lower() and 'categoria' in col.lower():
+        col_lower = col.lower()
+        if 'otras' in col_lower and 'categoria' in col_lower:
             return col
     
     return None
 
-def parse_multiple_options(data_series):
-    """Parsea opciones múltiples separadas por comas"""
-    all_options = []
-    for entry in data_series.dropna():
-        if pd.isna(entry) or entry == '' or str(entry).lower() in ['nan', 'none']:
-            continue
-        options = [opt.strip() for opt in str(entry).split(',')]
-        options = [opt for opt in options if opt and opt.lower() not in ['nan', 'none', '']]
-        all_options.extend(options)
-    return all_options
-
 def analyze_otras_categorias(df):
     """Analiza las otras categorías poblacionales"""
     if df is None or df.empty:
@@ -126,10 +120,10 @@ def analyze_otras_categorias(df):
         return None, None, "⚠️ No hay datos válidos en la columna de otras categorías"
     
     all_categorias = parse_multiple_options(valid_data)
-    if not all_categorias:
+    if all_categorias.empty:
         return None, None, "⚠️ No se pudieron extraer categorías válidas"
     
-    categorias_counts = pd.Series(all_categorias).value_counts()
+    categorias_counts = all_categorias.value_counts()
     total_menciones = len(all_categorias)
     comedores_con_categorias = len(valid_data)
     total_comedores = len(df)
@@ -159,31 +153,21 @@ def analyze_otras_categorias(df):
     
     return categorias_counts, categorias_col, analysis_text
 
+# Columnas de filtro del sidebar (columna esperada -> etiqueta)
+EXPECTED_FILTER_COLUMNS = {
+    'NOMBRE DEL COMEDOR': '📍 Comedor',
+    'BARRIO': '🏘️ Barrio', 
+    'COMUNA': '🏛️ Comuna',
+    'NODO ': '🔗 Nodo',
+    'NICHO ': '🎯 Nicho'
+}
+
 def create_filters_sidebar(df):
     """Crea filtros en sidebar de forma compacta"""
     st.sidebar.markdown("### 🔍 Filtros")
-    df_filtered = df.copy()
-    
-    # Columnas de filtro principales
-    filters = {
-        'NOMBRE DEL COMEDOR': '📍 Comedor',
-        'BARRIO': '🏘️ Barrio', 
-        'COMUNA': '🏛️ Comuna',
-        'NODO ': '🔗 Nodo',
-        'NICHO ': '🎯 Nicho'
-    }
-    
-    applied = {}
-    for col, label in filters.items():
-        found_col = col if col in df.columns else next((c for c in df.columns if col.lower().replace(' ', '') in c.lower().replace(' ', '')), None)
-        
-        if found_col and found_col in df_filtered.columns:
-            values = ['Todos'] + sorted([str(x) for x in df_filtered[found_col].dropna().unique() if str(x) != 'nan'])
-            if len(values) > 1:
-                selected = st.sidebar.selectbox(label, values, key=f"f_{col}")
-                if selected != 'Todos':
-                    df_filtered = df_filtered[df_filtered[found_col].astype(str) == selected]
-                    applied[found_col] = selected
+    # Columnas de filtro resueltas una sola vez por encabezados (en caché)
+    filter_columns = resolve_filter_columns(tuple(df.columns), EXPECTED_FILTER_COLUMNS)
+    df_filtered, _ = apply_sidebar_filters(df, filter_columns, key_prefix="f_")
     
     st.sidebar.markdown(f"**Registros:** {len(df_filtered):,}/{len(df):,}")
     if st.sidebar.button("🔄 Limpiar"):
@@ -253,7 +237,7 @@ def create_summary_table(categorias_counts):
     return pd.DataFrame({
         'Categoría Poblacional': categorias_counts.index,
         'Menciones': categorias_counts.values,
-        'Porcentaje': [f"{(c/total)*100:.1f}%" for c in categorias_counts.values],
+        'Porcentaje': (categorias_counts / total * 100).map('{:.1f}%'.format).values,
         'Ranking': range(1, len(categorias_counts) + 1)
     })
 
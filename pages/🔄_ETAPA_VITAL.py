@@ -1,6 +1,5 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 import sys
@@ -25,8 +24,11 @@ try:
 except ImportError:
     modules_loaded = False
 
+# Funciones compartidas por las páginas (opciones múltiples y filtros)
+from utils.page_helpers import parse_multiple_options, resolve_filter_columns, apply_sidebar_filters
+
 # CSS personalizado para esta página
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     .page-header {
         font-size: 2.2rem;
@@ -67,7 +69,8 @@ st.markdown("""
         border-left: 3px solid #4CAF50;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.html(CUSTOM_CSS)
 
 def find_etapa_vital_column(df):
     """Busca la columna de etapa vital en el DataFrame"""
@@ -90,29 +93,14 @@ def find_etapa_vital_column(df):
     
     # Buscar parcial
     for col in df.columns:
-        if 'etapa' in col.lower() and 'vital' in col.lower():
+        col_lower = col.lower()
+        if 'etapa' in col_lower and 'vital' in col_lower:
             return col
-        elif 'edad' in col.lower() or 'edades' in col.lower():
+        elif 'edad' in col_lower or 'edades' in col_lower:
             return col
     
     return None
 
-def parse_multiple_options(data_series):
-    """Parsea opciones múltiples separadas por comas"""
-    all_options = []
-    
-    for entry in data_series.dropna():
-        if pd.isna(entry) or entry == '' or str(entry).lower() in ['nan', 'none']:
-            continue
-        
-        # Dividir por comas y limpiar
-        options = [opt.strip() for opt in str(entry).split(',')]
-        # Filtrar opciones vacías
-        options = [opt for opt in options if opt and opt.lower() not in ['nan', 'none', '']]
-        all_options.extend(options)
-    
-    return all_options
-
 def analyze_etapa_vital(df):
     """Analiza las etapas vitales"""
     if df is None or df.empty:
@@ -133,11 +121,11 @@ def analyze_etapa_vital(df):
     # Parsear opciones múltiples
     all_etapas = parse_multiple_options(valid_data)
     
-    if not all_etapas:
+    if all_etapas.empty:
         return None, None, "⚠️ No se pudieron extraer etapas vitales válidas de los datos"
     
     # Contar frecuencias
-    etapa_counts = pd.Series(all_etapas).value_counts()
+    etapa_counts = all_etapas.value_counts()
     
     # Calcular estadísticas
     total_menciones = len(all_etapas)
@@ -191,50 +179,24 @@ def analyze_etapa_vital(df):
     
     return etapa_counts, etapa_col, analysis_text
 
+# Columnas de filtro del sidebar (columna esperada -> etiqueta)
+EXPECTED_FILTER_COLUMNS = {
+    'NOMBRE DEL COMEDOR': '📍 Nombre del Comedor',
+    'BARRIO': '🏘️ Barrio',
+    'COMUNA': '🏛️ Comuna',
+    'NODO ': '🔗 Nodo',
+    'NICHO ': '🎯 Nicho'
+}
+
 def create_filters_sidebar(df):
     """Crea los filtros en el sidebar"""
     st.sidebar.markdown("### 🔍 Filtros de Búsqueda")
     
-    df_filtered = df.copy()
-    
-    # Mapeo de columnas esperadas
-    column_mapping = {
-        'NOMBRE DEL COMEDOR': '📍 Nombre del Comedor',
-        'BARRIO': '🏘️ Barrio',
-        'COMUNA': '🏛️ Comuna',
-        'NODO ': '🔗 Nodo',
-        'NICHO ': '🎯 Nicho'
-    }
-    
-    # Buscar columnas que existen
-    filter_columns = {}
-    for expected_col, label in column_mapping.items():
-        found_col = None
-        
-        if expected_col in df.columns:
-            found_col = expected_col
-        else:
-            for col in df.columns:
-                if expected_col.lower().replace(' ', '') in col.lower().replace(' ', ''):
-                    found_col = col
-                    break
-        
-        if found_col:
-            filter_columns[found_col] = label
+    # Columnas de filtro resueltas una sola vez por encabezados (en caché)
+    filter_columns = resolve_filter_columns(tuple(df.columns), EXPECTED_FILTER_COLUMNS)
     
     # Crear filtros dinámicamente
-    applied_filters = {}
-    
-    for col, label in filter_columns.items():
-        if col in df_filtered.columns:
-            unique_values = ['Todos'] + sorted([str(x) for x in df_filtered[col].dropna().unique() if str(x) != 'nan'])
-            
-            if len(unique_values) > 1:
-                selected = st.sidebar.selectbox(label, unique_values, key=f"filter_{col}")
-                
-                if selected != 'Todos':
-                    df_filtered = df_filtered[df_filtered[col].astype(str) == selected]
-                    applied_filters[col] = selected
+    df_filtered, applied_filters = apply_sidebar_filters(df, filter_columns, key_prefix="filter_")
     
     # Información de filtros
     st.sidebar.markdown("---")
@@ -250,6 +212,9 @@ def create_filters_sidebar(df):
     
     return df_filtered
 
+# Escala YlOrRd sin sus tonos más claros (casi invisibles sobre el fondo blanco del gráfico)
+BAR_COLORSCALE = ['#feb24c', '#fd8d3c', '#fc4e2a', '#e31a1c', '#bd0026', '#800026']
+
 def create_horizontal_bar_chart(etapa_counts, title="Distribución por Etapas Vitales"):
     """Crea gráfico de barras horizontales"""
     
@@ -258,21 +223,21 @@ def create_horizontal_bar_chart(etapa_counts, title="Distribución por Etapas Vi
     
     fig = go.Figure()
     
-    # Colores degradados en tonos naranjas/amarillos
-    colors = px.colors.sequential.YlOrRd_r[:len(top_etapas)]
-    
+    # Colores degradados en tonos naranjas/rojos: Plotly los asigna según el valor (escala desde 0)
     fig.add_trace(go.Bar(
         y=top_etapas.index,
         x=top_etapas.values,
         orientation='h',
         marker=dict(
-            color=colors,
+            color=top_etapas.values,
+            colorscale=BAR_COLORSCALE,
+            cmin=0,
             line=dict(color='rgba(0,0,0,0.1)', width=1)
         ),
         text=top_etapas.values,
         textposition='outside',
         hovertemplate='<b>%{y}</b><br>Menciones: %{x}<br>Porcentaje: %{customdata:.1f}%<extra></extra>',
-        customdata=[(count/etapa_counts.sum())*100 for count in top_etapas.values]
+        customdata=top_etapas.values / etapa_counts.sum() * 100
     ))
     
     fig.update_layout(
@@ -317,7 +282,7 @@ def create_summary_table(etapa_counts):
     summary_df = pd.DataFrame({
         'Etapa Vital': etapa_counts.index,
         'Menciones': etapa_counts.values,
-        'Porcentaje': [f"{(count/total_menciones)*100:.1f}%" for count in etapa_counts.values],
+        'Porcentaje': (etapa_counts / total_menciones * 100).map('{:.1f}%'.format).values,
         'Ranking': range(1, len(etapa_counts) + 1)
     })
     
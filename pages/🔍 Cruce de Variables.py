@@ -1,6 +1,6 @@
 import streamlit as st
-import pandas as pd
-from datetime import datetime
+from bisect import insort
+from datetime import date, datetime
 
 # Configuración básica
 st.set_page_config(
@@ -11,7 +11,7 @@ st.set_page_config(
 )
 
 # CSS personalizado
-st.markdown("""
+CUSTOM_CSS = """
 <style>
 /* Estilo principal */
 .main-header {
@@ -96,10 +96,29 @@ st.markdown("""
 
 
 </style>
-""", unsafe_allow_html=True)
+"""
+st.html(CUSTOM_CSS)
 
 
 
+# Plantilla HTML de cada tarjeta de dashboard
+CARD_TEMPLATE = """<div class="dashboard-card">
+<div class="dashboard-title">{status_icon} {titulo}</div>
+<div class="dashboard-description">{descripcion}</div>
+<div class="dashboard-stats">
+<span class="stat-badge">📅 {fecha_creacion}</span>
+<span class="stat-badge">🏷️ {tags}</span>
+<span class="stat-badge">🔗 <a href="{url}" target="_blank">Abrir Dashboard</a></span>
+</div>
+</div>"""
+
+# Claves de orden de cada vista (ascendentes, para mantenerlas ordenadas con bisect)
+SORT_KEYS = {
+    "Más reciente": lambda d: -date.fromisoformat(d['fecha_creacion']).toordinal(),
+    "Más antiguo": lambda d: d['fecha_creacion'],
+    "Alfabético": lambda d: d['titulo'],
+}
+
 # Inicializar session state para los dashboards
 if 'dashboards' not in st.session_state:
     st.session_state.dashboards = [
@@ -141,6 +160,21 @@ if 'dashboards' not in st.session_state:
         }
     ]
 
+# Agregados mantenidos de forma incremental en add_dashboard (evita recorrer la lista en cada rerun)
+if 'tag_index' not in st.session_state:
+    # Índice invertido: tag -> ids de dashboards que lo contienen
+    st.session_state.tag_index = {}
+    for dashboard in st.session_state.dashboards:
+        for tag in dashboard['tags']:
+            st.session_state.tag_index.setdefault(tag, set()).add(dashboard['id'])
+    st.session_state.active_count = sum(1 for d in st.session_state.dashboards if d['activo'])
+
+# Vistas pre-ordenadas por cada criterio; se ordenan una vez por sesión
+if 'sorted_views' not in st.session_state:
+    st.session_state.sorted_views = {
+        order: sorted(st.session_state.dashboards, key=key) for order, key in SORT_KEYS.items()
+    }
+
 def add_dashboard(titulo, descripcion, url, tags):
     """Añade un nuevo dashboard a la lista"""
     new_dashboard = {
@@ -153,6 +187,13 @@ def add_dashboard(titulo, descripcion, url, tags):
         'activo': True
     }
     st.session_state.dashboards.append(new_dashboard)
+    
+    # Actualizar agregados
+    for tag in tags:
+        st.session_state.tag_index.setdefault(tag, set()).add(new_dashboard['id'])
+    st.session_state.active_count += 1
+    for order, key in SORT_KEYS.items():
+        insort(st.session_state.sorted_views[order], new_dashboard, key=key)
 
 def main():
     # Header principal
@@ -164,7 +205,7 @@ def main():
         
         # Estadísticas generales
         total_dashboards = len(st.session_state.dashboards)
-        active_dashboards = len([d for d in st.session_state.dashboards if d['activo']])
+        active_dashboards = st.session_state.active_count
         
         st.markdown(f"""
         <div class="sidebar-section">
@@ -200,49 +241,41 @@ def main():
         st.markdown("## 🔍 Filtros")
         
         # Filtro por tags
-        all_tags = list(set([tag for dashboard in st.session_state.dashboards for tag in dashboard['tags']]))
+        all_tags = list(st.session_state.tag_index)
         selected_tags = st.multiselect("Filtrar por tags:", all_tags)
         
         # Orden
-        sort_order = st.selectbox("Ordenar por:", ["Más reciente", "Más antiguo", "Alfabético"])
+        sort_order = st.selectbox("Ordenar por:", list(SORT_KEYS))
     
 
     
     # Contenido principal - Lista de Dashboards
     st.markdown("## 📋 Lista de Dashboards")
     
-    # Filtrar dashboards
-    filtered_dashboards = st.session_state.dashboards.copy()
+    # Tomar la vista ya ordenada según el criterio elegido (sin reordenar)
+    filtered_dashboards = st.session_state.sorted_views[sort_order]
     
+    # Filtrar dashboards (una pasada lineal que conserva el orden)
     if selected_tags:
-        filtered_dashboards = [d for d in filtered_dashboards if any(tag in d['tags'] for tag in selected_tags)]
-    
-    # Ordenar dashboards
-    if sort_order == "Más reciente":
-        filtered_dashboards.sort(key=lambda x: x['fecha_creacion'], reverse=True)
-    elif sort_order == "Más antiguo":
-        filtered_dashboards.sort(key=lambda x: x['fecha_creacion'])
-    elif sort_order == "Alfabético":
-        filtered_dashboards.sort(key=lambda x: x['titulo'])
+        # Unión de los ids de cada tag seleccionado usando el índice invertido
+        selected_ids = set().union(*(st.session_state.tag_index.get(tag, set()) for tag in selected_tags))
+        filtered_dashboards = [d for d in filtered_dashboards if d['id'] in selected_ids]
     
     # Mostrar dashboards (SIN botones de eliminar, ver, cambiar estado)
     if filtered_dashboards:
-        for dashboard in filtered_dashboards:
-            status_icon = "🟢" if dashboard['activo'] else "🔴"
-            
-            st.markdown(f"""
-            <div class="dashboard-card">
-                <div class="dashboard-title">{status_icon} {dashboard['titulo']}</div>
-                <div class="dashboard-description">{dashboard['descripcion']}</div>
-                <div class="dashboard-stats">
-                    <span class="stat-badge">📅 {dashboard['fecha_creacion']}</span>
-                    <span class="stat-badge">🏷️ {', '.join(dashboard['tags'])}</span>
-                    <span class="stat-badge">🔗 <a href="{dashboard['url']}" target="_blank">Abrir Dashboard</a></span>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            st.markdown("---")
+        # Todas las tarjetas en un solo bloque, separadas por una línea horizontal
+        cards = [
+            CARD_TEMPLATE.format(
+                status_icon="🟢" if dashboard['activo'] else "🔴",
+                titulo=dashboard['titulo'],
+                descripcion=dashboard['descripcion'],
+                fecha_creacion=dashboard['fecha_creacion'],
+                tags=', '.join(dashboard['tags']),
+                url=dashboard['url'],
+            )
+            for dashboard in filtered_dashboards
+        ]
+        st.markdown("\n\n---\n\n".join(cards) + "\n\n---", unsafe_allow_html=True)
     else:
         st.markdown("""
         <div class="warning-message">
@@ -1,6 +1,5 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 import sys
@@ -24,8 +23,11 @@ try:
 except ImportError:
     modules_loaded = False
 
+# Funciones compartidas por las páginas (opciones múltiples y filtros)
+from utils.page_helpers import resolve_filter_columns, apply_sidebar_filters
+
 # CSS personalizado para esta página
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     .page-header {
         font-size: 2.2rem;
@@ -66,7 +68,8 @@ st.markdown("""
         border-left: 3px solid #4CAF50;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.html(CUSTOM_CSS)
 
 def find_tipo_comedor_column(df):
     """Busca la columna de tipo de comedor en el DataFrame"""
@@ -88,7 +91,8 @@ def find_tipo_comedor_column(df):
     
     # Buscar parcial
     for col in df.columns:
-        if 'tipo' in col.lower() and 'comedor' in col.lower():
+        col_lower = col.lower()
+        if 'tipo' in col_lower and 'comedor' in col_lower:
             return col
     
     return None
@@ -113,6 +117,7 @@ def analyze_tipo_comedor(df):
     # Contar frecuencias
     tipo_counts = valid_data.value_counts()
     total_comedores = len(valid_data)
+    tipo_percentages = tipo_counts.mul(100.0 / total_comedores)
     
     # Crear análisis textual
     analysis_text = f"""
@@ -126,13 +131,15 @@ def analyze_tipo_comedor(df):
 **Distribución por tipo:**
 """
     
-    for tipo, count in tipo_counts.items():
-        percentage = (count / total_comedores) * 100
-        analysis_text += f"\n- **{tipo}:** {count:,} comedores ({percentage:.1f}%)"
+    lines = [
+        f"- **{tipo}:** {count:,} comedores ({percentage:.1f}%)"
+        for tipo, count, percentage in zip(tipo_counts.index, tipo_counts.values, tipo_percentages.values)
+    ]
+    analysis_text += "\n" + "\n".join(lines)
     
     if len(tipo_counts) > 0:
         tipo_mas_comun = tipo_counts.index[0]
-        percentage_mas_comun = (tipo_counts.iloc[0] / total_comedores) * 100
+        percentage_mas_comun = tipo_percentages.iloc[0]
         analysis_text += f"""
 
 **Insights Clave:**
@@ -142,55 +149,29 @@ def analyze_tipo_comedor(df):
         
         if len(tipo_counts) > 1:
             segundo_tipo = tipo_counts.index[1]
-            percentage_segundo = (tipo_counts.iloc[1] / total_comedores) * 100
+            percentage_segundo = tipo_percentages.iloc[1]
             analysis_text += f"\n- **Segundo tipo:** {segundo_tipo} ({percentage_segundo:.1f}%)"
     
     return tipo_counts, tipo_col, analysis_text
 
+# Columnas de filtro del sidebar (columna esperada -> etiqueta)
+EXPECTED_FILTER_COLUMNS = {
+    'NOMBRE DEL COMEDOR': '📍 Nombre del Comedor',
+    'BARRIO': '🏘️ Barrio',
+    'COMUNA': '🏛️ Comuna',
+    'NODO ': '🔗 Nodo',
+    'NICHO ': '🎯 Nicho'
+}
+
 def create_filters_sidebar(df):
     """Crea los filtros en el sidebar"""
     st.sidebar.markdown("### 🔍 Filtros de Búsqueda")
     
-    df_filtered = df.copy()
-    
-    # Mapeo de columnas esperadas
-    column_mapping = {
-        'NOMBRE DEL COMEDOR': '📍 Nombre del Comedor',
-        'BARRIO': '🏘️ Barrio',
-        'COMUNA': '🏛️ Comuna',
-        'NODO ': '🔗 Nodo',
-        'NICHO ': '🎯 Nicho'
-    }
-    
-    # Buscar columnas que existen
-    filter_columns = {}
-    for expected_col, label in column_mapping.items():
-        found_col = None
-        
-        if expected_col in df.columns:
-            found_col = expected_col
-        else:
-            for col in df.columns:
-                if expected_col.lower().replace(' ', '') in col.lower().replace(' ', ''):
-                    found_col = col
-                    break
-        
-        if found_col:
-            filter_columns[found_col] = label
+    # Columnas de filtro resueltas una sola vez por encabezados (en caché)
+    filter_columns = resolve_filter_columns(tuple(df.columns), EXPECTED_FILTER_COLUMNS)
     
     # Crear filtros dinámicamente
-    applied_filters = {}
-    
-    for col, label in filter_columns.items():
-        if col in df_filtered.columns:
-            unique_values = ['Todos'] + sorted([str(x) for x in df_filtered[col].dropna().unique() if str(x) != 'nan'])
-            
-            if len(unique_values) > 1:
-                selected = st.sidebar.selectbox(label, unique_values, key=f"filter_{col}")
-                
-                if selected != 'Todos':
-                    df_filtered = df_filtered[df_filtered[col].astype(str) == selected]
-                    applied_filters[col] = selected
+    df_filtered, applied_filters = apply_sidebar_filters(df, filter_columns, key_prefix="filter_")
     
     # Información de filtros
     st.sidebar.markdown("---")
@@ -287,7 +268,7 @@ def create_summary_table(tipo_counts):
     summary_df = pd.DataFrame({
         'Tipo de Comedor': tipo_counts.index,
         'Cantidad': tipo_counts.values,
-        'Porcentaje': [f"{(count/total_comedores)*100:.1f}%" for count in tipo_counts.values],
+        'Porcentaje': (tipo_counts / total_comedores * 100).map('{:.1f}%'.format).values,
         'Ranking': range(1, len(tipo_counts) + 1)
     })
     
@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+import requests
+from gspread.exceptions import APIError
+
+# Agregar la raíz del proyecto para importar utils
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import api_errors
+
+
+def api_error(status):
+    """APIError de gspread con la respuesta HTTP indicada"""
+    response = requests.Response()
+    response.status_code = status
+    response._content = b'{"error": {"code": %d, "message": "error"}}' % status
+    return APIError(response)
+
+
+class FailingCall:
+    """Función que siempre falla con el error dado y cuenta sus llamadas"""
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        raise self.error
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waits = []
+    monkeypatch.setattr(api_errors.time, 'sleep', waits.append)
+    return waits
+
+
+def test_transient_error_is_retried_a_bounded_number_of_times(sleeps):
+    call = FailingCall(api_error(429))
+    with pytest.raises(APIError):
+        api_errors.call_with_retry(call)
+    assert call.calls == api_errors.RETRY_ATTEMPTS
+    assert sleeps == [1, 2, 4]
+    assert max(sleeps) <= api_errors.RETRY_MAX_WAIT
+
+
+def test_permanent_error_is_not_retried(sleeps):
+    call = FailingCall(api_error(403))
+    with pytest.raises(APIError):
+        api_errors.call_with_retry(call)
+    assert call.calls == 1
+    assert sleeps == []
+
+
+def test_success_after_transient_error(sleeps):
+    results = iter([api_error(503), 'datos'])
+
+    def call():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert api_errors.call_with_retry(call) == 'datos'
+    assert sleeps == [1]
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pandas as pd
+
+# Agregar la raíz del proyecto para importar app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+def _sample_frame():
+    """Datos con comas, comillas, saltos de línea, nulos, categorías y enteros con nulos"""
+    raw = pd.DataFrame({
+        'NOMBRE DEL COMEDOR': ['Comedor A', 'Comedor "B"', 'C, sede 2', ''],
+        'BARRIO': ['El Poblado', 'Centro', None, 'Centro'],
+        'COMUNA': ['1', '2', 'sin dato', '14'],
+        'NECESIDADES': ['Agua, Gas', 'Línea 1\nLínea 2', 'None', 'Alimentos'],
+        'OBSERVACIONES': ['ñandú á é', '', 'x;y', '  con espacios  '],
+    }, dtype=app.TEXT_DTYPE)
+    return app.clean_dataframe(raw)
+
+
+def test_to_csv_matches_pandas_to_csv():
+    df = _sample_frame()
+    columns = tuple(df.columns)
+    expected = df[list(columns)].to_csv(index=False).encode('utf-8')
+    assert app._to_csv(df, columns) == expected
+
+
+def test_to_csv_matches_pandas_to_csv_for_selected_columns():
+    df = _sample_frame()
+    columns = ('COMUNA', 'NOMBRE DEL COMEDOR')
+    expected = df[list(columns)].to_csv(index=False).encode('utf-8')
+    assert app._to_csv(df, columns) == expected
@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+import requests
+import streamlit as st
+from gspread.exceptions import APIError
+
+# Agregar la raíz del proyecto para importar app.py y utils
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from utils import api_errors
+from utils import google_sheets
+
+SHEET_ID = 'hoja-de-prueba'
+WORKSHEET_NAME = 'Respuestas de formulario 1'
+
+
+def api_error(status):
+    """APIError de gspread con la respuesta HTTP indicada"""
+    response = requests.Response()
+    response.status_code = status
+    response._content = b'{"error": {"code": %d, "message": "error"}}' % status
+    return APIError(response)
+
+
+class FailingSheet:
+    """Hoja y pestaña falsas cuya descarga de valores siempre responde con el error dado"""
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def get_lastUpdateTime(self):
+        return None
+
+    def _fail(self, *args, **kwargs):
+        self.calls += 1
+        raise self.error
+
+    get_all_values = _fail
+    values_batch_get = _fail
+
+
+@pytest.fixture
+def last_good_frame(monkeypatch):
+    monkeypatch.setattr(api_errors.time, 'sleep', lambda seconds: None)
+    return pd.DataFrame({'NOMBRE DEL COMEDOR': ['Comedor A', 'Comedor B']})
+
+
+def test_app_transient_api_error_returns_last_good_frame(monkeypatch, last_good_frame):
+    sheet = FailingSheet(api_error(429))
+    monkeypatch.setattr(app, 'has_service_account', lambda: True)
+    monkeypatch.setattr(app, '_get_spreadsheet', lambda sheet_id: sheet)
+    monkeypatch.setattr(app, '_get_worksheet', lambda sheet_id, worksheet_name: sheet)
+    app.load_data_secure.clear()
+    app._last_good_data()[(SHEET_ID, WORKSHEET_NAME)] = last_good_frame
+    
+    df = app.load_data_with_fallback(SHEET_ID, WORKSHEET_NAME)
+    
+    assert df is last_good_frame
+    assert sheet.calls == api_errors.RETRY_ATTEMPTS
+
+
+def test_pages_transient_api_error_returns_last_good_frame(monkeypatch, last_good_frame):
+    sheet = FailingSheet(api_error(503))
+    monkeypatch.setattr(st, 'secrets', {'gcp_service_account': {}}, raising=False)
+    monkeypatch.setattr(google_sheets, '_get_spreadsheet', lambda sheet_id: sheet)
+    google_sheets._load_sheet.clear()
+    google_sheets._last_good_data()['df'] = last_good_frame
+    
+    df = google_sheets.load_data_from_sheets()
+    
+    assert df is last_good_frame
+    assert sheet.calls == api_errors.RETRY_ATTEMPTS
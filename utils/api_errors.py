@@ -0,0 +1,41 @@
+import requests
+import time
+
+# Códigos HTTP que indican un fallo pasajero de la API (tiempo agotado, cuota excedida, servidor)
+TRANSIENT_STATUS_CODES = {408, 429}
+
+# Reintentos ante errores pasajeros: intentos en total y espera máxima entre ellos (segundos)
+RETRY_ATTEMPTS = 4
+RETRY_MAX_WAIT = 8
+
+def is_transient_error(error):
+    """
+    Indica si el error es pasajero (cuota, servidor, red) y conviene reintentar en la próxima recarga;
+    los demás (sin permiso, hoja o pestaña inexistente...) se repetirían igual en cada intento
+    """
+    # gspread.exceptions.APIError y requests.HTTPError traen la respuesta HTTP
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is not None:
+        return status in TRANSIENT_STATUS_CODES or status >= 500
+
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+        return True
+
+    try:
+        from google.auth.exceptions import TransportError
+    except ImportError:
+        return False
+    return isinstance(error, TransportError)
+
+def call_with_retry(func, *args, **kwargs):
+    """
+    Llama a func reintentando los errores pasajeros con espera exponencial (1, 2, 4... s, como máximo RETRY_MAX_WAIT);
+    los errores permanentes, o el pasajero tras RETRY_ATTEMPTS intentos, se propagan
+    """
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == RETRY_ATTEMPTS - 1 or not is_transient_error(e):
+                raise
+            time.sleep(min(2 ** attempt, RETRY_MAX_WAIT))
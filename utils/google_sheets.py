@@ -3,130 +3,148 @@ import pandas as pd
 import gspread
 from google.oauth2.service_account import Credentials
 
+from utils.api_errors import is_transient_error, call_with_retry
+from utils.parquet_cache import sheet_version, parquet_cache_path, read_parquet_cache, write_parquet_cache
+
+# Texto respaldado por PyArrow: buffers contiguos en lugar de objetos str de Python
+TEXT_DTYPE = "string[pyarrow]"
+
 def make_headers_unique(headers):
     """Hace únicos los headers duplicados agregando sufijos numéricos"""
-    unique_headers = []
-    header_counts = {}
-    
-    for header in headers:
-        if header in header_counts:
-            header_counts[header] += 1
-            unique_header = f"{header}_{header_counts[header]}"
-        else:
-            header_counts[header] = 0
-            unique_header = header
-        
-        unique_headers.append(unique_header)
-    
-    return unique_headers
+    headers = pd.Series(headers, dtype=object)
+    # Número de apariciones previas de cada header: 0 para la primera, 1, 2... para las repetidas
+    counts = headers.groupby(headers, sort=False).cumcount()
+    return headers.where(counts == 0, headers + '_' + counts.astype(str)).tolist()
 
+# Al cambiar esta limpieza, subir CACHE_FORMAT_VERSION (utils/parquet_cache.py): el Parquet guarda su resultado
 def clean_dataframe(df):
     """Limpia y prepara el DataFrame"""
     try:
         # Eliminar filas completamente vacías
         df = df.dropna(how='all')
         
-        # Convertir columnas numéricas donde sea posible
-        numeric_columns = ['COMUNA', 'NODO ', 'NICHO ', 'AÑO DE VINCULACIÓN AL PROGRAMA']
-        for col in numeric_columns:
-            if col in df.columns:
-                try:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                except Exception as e:
-                    pass  # Silenciar errores en las páginas
+        # Convertir columnas numéricas en bloque al entero con nulos más pequeño que admita cada una
+        # (Int8/Int16 para comunas, nodos y años; los valores no convertibles quedan como NA)
+        numeric_columns = [col for col in ['COMUNA', 'NODO ', 'NICHO ', 'AÑO DE VINCULACIÓN AL PROGRAMA'] if col in df.columns]
+        if numeric_columns:
+            df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce', downcast='integer')
         
         # Limpiar espacios en blanco en columnas de texto
-        text_columns = df.select_dtypes(include=['object']).columns
-        for col in text_columns:
-            try:
-                df[col] = df[col].astype(str).str.strip()
-                df[col] = df[col].replace(['', 'nan', 'None'], None)
-            except Exception as e:
-                pass  # Silenciar errores en las páginas
+        # (una sola pasada sobre todas las columnas de texto, en lugar de una por columna)
+        text_columns = df.select_dtypes(include=['object', 'string']).columns
+        if len(text_columns) > 0:
+            text_data = df[text_columns].astype(TEXT_DTYPE).apply(lambda s: s.str.strip())
+            df[text_columns] = text_data.mask(text_data.isin(['', 'nan', 'None']))
         
         return df
         
     except Exception as e:
         return df
 
+@st.cache_resource(show_spinner=False)
+def _get_spreadsheet(sheet_id):
+    """Autoriza el cliente y abre la hoja de cálculo una sola vez por proceso"""
+    # Obtener credenciales desde secrets
+    credentials_info = dict(st.secrets["gcp_service_account"])
+    
+    # Usar scope actualizado
+    scope = [
+        'https://www.googleapis.com/auth/spreadsheets.readonly',
+        'https://www.googleapis.com/auth/drive.readonly'
+    ]
+    
+    # Crear credenciales
+    credentials = Credentials.from_service_account_info(credentials_info, scopes=scope)
+    
+    # Autorizar el cliente
+    gc = gspread.authorize(credentials)
+    
+    return gc.open_by_key(sheet_id)
+
+@st.cache_resource(show_spinner=False)
+def _last_good_data():
+    """Última carga exitosa de la hoja, compartida por todas las sesiones del proceso"""
+    return {}
+
 @st.cache_data(ttl=300)
-def load_data_from_sheets():
+def _load_sheet():
     """
-    Carga datos usando configuración segura desde Streamlit Secrets
-    Compatible con las páginas adicionales
+    Descarga y limpia la hoja; los errores pasajeros de la API se propagan para que no queden en caché
     """
     try:
         # Verificar si existen los secrets
         if not hasattr(st, 'secrets') or 'gcp_service_account' not in st.secrets:
             return None
         
-        # Obtener credenciales desde secrets
-        credentials_info = dict(st.secrets["gcp_service_account"])
-        
-        # Usar scope actualizado
-        scope = [
-            'https://www.googleapis.com/auth/spreadsheets.readonly',
-            'https://www.googleapis.com/auth/drive.readonly'
-        ]
-        
-        # Crear credenciales
-        credentials = Credentials.from_service_account_info(credentials_info, scopes=scope)
-        
-        # Autorizar el cliente
-        gc = gspread.authorize(credentials)
-        
         # Obtener configuración de Google Sheets
         sheet_id = st.secrets.get("google_sheets", {}).get("sheet_id", "1fbs-J474JbvV3USg5aQlLUW9sNqkBjcd63qBU1nJeeI")
         worksheet_name = st.secrets.get("google_sheets", {}).get("worksheet_name", "Respuestas de formulario 1")
         
-        # Abrir la hoja de cálculo
-        spreadsheet = gc.open_by_key(sheet_id)
+        # Abrir la hoja de cálculo (cliente y hoja se reutilizan entre recargas);
+        # las llamadas a la API reintentan unas pocas veces los errores pasajeros (429, 5xx, red)
+        spreadsheet = call_with_retry(_get_spreadsheet, sheet_id)
+        
+        # Si esta versión de la hoja ya está guardada en Parquet, evitar la descarga completa
+        # (prefijo propio: las páginas limpian los datos distinto que app.py)
+        parquet_path = parquet_cache_path(sheet_id, worksheet_name, sheet_version(spreadsheet), prefix='pages_')
+        df = read_parquet_cache(parquet_path)
+        if df is not None:
+            return df
         
-        # Intentar obtener la hoja específica
-        try:
-            worksheet = spreadsheet.worksheet(worksheet_name)
-        except gspread.WorksheetNotFound:
+        # Obtener todos los valores de la pestaña en una sola llamada, sin pedir antes sus metadatos
+        # (si la pestaña no existe la API responde con error y se devuelve None)
+        sheet_range = "'{}'".format(worksheet_name.replace("'", "''"))
+        response = call_with_retry(spreadsheet.values_batch_get, [sheet_range])
+        all_values = response['valueRanges'][0].get('values', [])
+        
+        if len(all_values) < 2:
             return None
         
-        # Manejar headers duplicados
-        try:
-            # Intentar método estándar primero
-            data = worksheet.get_all_records()
-            if not data:
-                return None
-            df = pd.DataFrame(data)
-            
-        except Exception as e:
-            if "header row" in str(e).lower() and ("unique" in str(e).lower() or "duplicates" in str(e).lower()):
-                # Método alternativo para headers duplicados
-                all_values = worksheet.get_all_values()
-                
-                if not all_values:
-                    return None
-                
-                # Tomar la primera fila como headers y hacer únicos
-                headers = all_values[0]
-                unique_headers = make_headers_unique(headers)
-                
-                # Crear DataFrame con headers únicos
-                data_rows = all_values[1:]  # Excluir header
-                df = pd.DataFrame(data_rows, columns=unique_headers)
-            else:
-                raise e
+        # Tomar la primera fila como headers (haciendo únicos los duplicados);
+        # la API omite las celdas vacías del final, así que se completa hasta la fila más ancha
+        width = max(len(row) for row in all_values)
+        headers = make_headers_unique(all_values[0] + [''] * (width - len(all_values[0])))
+        df = pd.DataFrame(all_values[1:], columns=headers, dtype=TEXT_DTYPE)
         
         if df.empty:
             return None
         
         # Limpiar datos básicos
         df = clean_dataframe(df)
+        write_parquet_cache(parquet_path, df)
         
         return df
         
     except gspread.SpreadsheetNotFound:
         return None
     except Exception as e:
+        if is_transient_error(e):
+            # Cuota excedida, error del servidor o de red que persistió tras los reintentos:
+            # se propaga (no queda en caché) y se vuelve a intentar en la próxima recarga
+            raise
+        # Error permanente (sin permiso, pestaña inexistente...): None queda en caché como antes.
+        # Descartar la hoja cacheada por si quedó inválida (credenciales revocadas, hoja borrada...)
+        _get_spreadsheet.clear()
         return None
 
+def load_data_from_sheets():
+    """
+    Carga datos usando configuración segura desde Streamlit Secrets
+    Compatible con las páginas adicionales
+    """
+    try:
+        df = _load_sheet()
+    except Exception:
+        # Error pasajero que persistió tras los reintentos: mostrar la última versión cargada si existe
+        df = _last_good_data().get('df')
+        if df is not None:
+            st.warning("⚠️ No se pudo actualizar desde Google Sheets; se muestran los últimos datos cargados.")
+        return df
+    
+    if df is not None:
+        _last_good_data()['df'] = df
+    return df
+
 # Función alternativa para compatibilidad con app.py principal
 def load_data_secure():
     """Alias para compatibilidad con app.py principal"""
@@ -0,0 +1,103 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+
+# Valores que se consideran respuesta vacía (comparados en minúsculas)
+EMPTY_OPTIONS = ['', 'nan', 'none']
+
+def parse_multiple_options(data_series):
+    """Parsea opciones múltiples separadas por comas"""
+    # Dividir, expandir y limpiar todas las respuestas de una vez (sin bucle por fila)
+    options = data_series.dropna().astype(str).str.split(',').explode().str.strip()
+    # Filtrar opciones vacías en una sola pasada sobre el texto normalizado
+    options = options[~options.str.lower().isin(EMPTY_OPTIONS)].reset_index(drop=True)
+    # Categórica: pocas opciones muy repetidas, value_counts trabaja sobre códigos enteros
+    return options.astype('category')
+
+@st.cache_data(show_spinner=False)
+def resolve_filter_columns(columns, expected_columns):
+    """
+    Busca la columna real de cada filtro esperado (exacta o sin espacios ni mayúsculas)
+    Devuelve {columna encontrada: etiqueta}; en caché según los encabezados de la hoja
+    """
+    # Nombres normalizados una sola vez (sin espacios, en minúsculas)
+    normalized_columns = [(col, col.lower().replace(' ', '')) for col in columns]
+    filter_columns = {}
+    for expected_col, label in expected_columns.items():
+        if expected_col in columns:
+            found_col = expected_col
+        else:
+            expected_normalized = expected_col.lower().replace(' ', '')
+            found_col = next((col for col, normalized in normalized_columns if expected_normalized in normalized), None)
+        
+        if found_col and found_col not in filter_columns:
+            filter_columns[found_col] = label
+    return filter_columns
+
+def sorted_options(series):
+    """Valores distintos de la columna como texto, ordenados y sin vacíos"""
+    # En las categóricas los valores distintos ya están en .cat.categories (sin recorrer filas)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        values = series.cat.categories.astype(str)
+    else:
+        values = series.dropna().astype(str).unique()
+    return sorted(v for v in values if v not in ('nan', 'None', ''))
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def filter_options(filter_data):
+    """
+    Valores de cada columna de filtro, calculados una sola vez por datos
+    Recibe solo las columnas de filtro: la caché no recorre la hoja completa en cada recarga
+    """
+    return {col: sorted_options(filter_data[col]) for col in filter_data.columns}
+
+def present_values(series, mask):
+    """Valores (como texto) que siguen presentes en las filas seleccionadas por la máscara"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Trabajar sobre los códigos enteros: -1 marca los nulos
+        codes = np.unique(series.cat.codes.to_numpy()[mask])
+        return set(series.cat.categories[codes[codes >= 0]].astype(str))
+    return {str(v) for v in series[mask].dropna().unique()}
+
+def filter_mask(series, selected):
+    """Compara la columna con el valor elegido en su propio tipo, sin convertirla a texto"""
+    if pd.api.types.is_numeric_dtype(series):
+        selected = pd.to_numeric(selected)
+    return (series == selected).to_numpy(dtype=bool, na_value=False)
+
+def apply_sidebar_filters(df, filter_columns, key_prefix, default_options=None, options=None):
+    """
+    Crea un selectbox por filtro en el sidebar (opciones en cascada) y aplica los elegidos
+    default_options: opción "sin filtro" por columna ('Todos' si no se indica)
+    options: valores ya calculados por columna (si no, se obtienen con filter_options)
+    Devuelve (DataFrame filtrado, {columna: valor elegido})
+    """
+    if options is None:
+        options = filter_options(df[list(filter_columns)])
+    default_options = default_options or {}
+    
+    # Una sola máscara para todos los filtros; el DataFrame se recorta una vez al final
+    mask = np.ones(len(df), dtype=bool)
+    applied_filters = {}
+    
+    for col, label in filter_columns.items():
+        default_option = default_options.get(col, 'Todos')
+        values = options[col]
+        
+        # Opciones en cascada: solo los valores presentes en las filas que pasan los filtros anteriores
+        if applied_filters:
+            present = present_values(df[col], mask)
+            values = [v for v in values if v in present]
+        
+        values = [default_option] + values
+        
+        if len(values) > 1:
+            selected = st.sidebar.selectbox(label, values, key=f"{key_prefix}{col}")
+            
+            if selected != default_option:
+                mask &= filter_mask(df[col], selected)
+                applied_filters[col] = selected
+    
+    # Sin filtros se usa el DataFrame original (sin copia)
+    df_filtered = df[mask] if applied_filters else df
+    return df_filtered, applied_filters
@@ -0,0 +1,63 @@
+import pandas as pd
+import os
+import tempfile
+from urllib.parse import quote
+
+# Copia local en Parquet de la última versión de cada hoja (sobrevive a reinicios del proceso)
+PARQUET_CACHE_DIR = os.path.join(tempfile.gettempdir(), "comedores_cache")
+
+# Versión del formato guardado: subirla cada vez que cambie clean_dataframe (app.py o utils/google_sheets.py),
+# para que un despliegue nuevo no sirva datos limpiados con la lógica anterior
+CACHE_FORMAT_VERSION = 1
+
+def sheet_version(spreadsheet):
+    """Fecha de última modificación de la hoja según Drive (None si no se puede consultar)"""
+    try:
+        return spreadsheet.get_lastUpdateTime()
+    except Exception:
+        return None
+
+def parquet_cache_path(sheet_id, worksheet_name, version, prefix=''):
+    """
+    Ruta del Parquet local para una versión concreta de la hoja (None si no hay versión)
+    El prefijo separa las copias que se limpian de forma distinta (app.py y las páginas)
+    """
+    if not version:
+        return None
+    import gspread
+    # Una carpeta por hoja y pestaña: al guardar una versión se borran las anteriores
+    folder = os.path.join(PARQUET_CACHE_DIR, f"{prefix}{sheet_id}_{quote(worksheet_name, safe='')}")
+    # El formato de la limpieza y la versión de gspread forman parte del nombre:
+    # con otra limpieza u otra versión de gspread los datos guardados pueden no coincidir
+    name = f"{quote(version, safe='')}_v{CACHE_FORMAT_VERSION}_gspread{gspread.__version__}.parquet"
+    return os.path.join(folder, name)
+
+def read_parquet_cache(path):
+    """Lee el DataFrame limpio guardado en Parquet (None si no existe o no se puede leer)"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return pd.read_parquet(path)
+    except Exception:
+        return None
+
+def write_parquet_cache(path, df):
+    """
+    Guarda el DataFrame limpio en Parquet y borra las versiones anteriores de la misma hoja;
+    si falla, simplemente no hay copia local
+    """
+    if not path:
+        return
+    folder = os.path.dirname(path)
+    try:
+        os.makedirs(folder, exist_ok=True)
+        # Escribir aparte y renombrar: nunca se lee un archivo a medio escribir
+        tmp_path = f"{path}.tmp"
+        df.to_parquet(tmp_path, compression='zstd', index=False)
+        os.replace(tmp_path, path)
+        for name in os.listdir(folder):
+            old_path = os.path.join(folder, name)
+            if old_path != path:
+                os.remove(old_path)
+    except Exception:
+        pass